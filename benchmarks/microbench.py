@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the pure python hot paths of sphinx-julia.
+
+Every case is timed and divided by the time of a fixed calibration loop,
+which makes the numbers roughly comparable between machines. The
+resulting relative costs are compared with the baselines stored in
+baselines.json next to this file.
+
+Usage::
+
+    python benchmarks/microbench.py            # show results
+    python benchmarks/microbench.py --check    # fail on regressions
+    python benchmarks/microbench.py --update   # store new baselines
+
+Julia is not needed.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sphinxjulia import model, parsing_sphinxstring, query
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+TYPES = ["Int64", "Float64", "AbstractString", "Vector{Complex{Float64}}",
+         "Dict{Symbol,Tuple{Int,Vector{T}}}"]
+
+LONG_PARAMETRIC = (
+    "QuantumOptics.timeevolution.master("
+    "tspan::Vector{Float64}, rho0::DenseOperator{B,B,Matrix{Complex{T}}}, "
+    "H::AbstractOperator{B,B}, J::Vector{Union{SparseOperator{B,B}, "
+    "DenseOperator{B,B,Matrix{Complex{T}}}}}; "
+    "rates::Union{Vector{Float64},Matrix{Float64},Nothing}=nothing, "
+    "Jdagger::Vector=dagger.(J), fout::Union{Function,Nothing}=nothing, "
+    "kwargs...) where {B<:Basis, T<:Real}")
+
+NESTED = ", ".join(
+    "x%d::%s" % (i, "Dict{" * 8 + "Int" + ",Vector{Int}}" * 8)
+    for i in range(6))
+
+SCOPE = ["M%d" % i for i in range(40)]
+
+
+def calibration():
+    x = 0
+    for i in range(1000):
+        x += i * i
+    return x
+
+
+def make_overloads(n):
+    """
+    Domain dictionary holding n methods of the function f.
+    """
+    dictionary = {}
+    for i in range(n):
+        nargs = i % 6
+        arguments = ", ".join("a%d::%s" % (j, TYPES[(i + j) % len(TYPES)])
+                              for j in range(nargs))
+        if i % 2:
+            arguments += "; k=1"
+        text = "f(%s)" % arguments
+        if i % 3:
+            text += " where {T}"
+        f = parsing_sphinxstring.parse_functionstring(text)
+        f.register("doc%d" % (i % 50), ["Outer", "Inner%d" % (i % 4)],
+                   dictionary)
+    return dictionary
+
+
+def make_types(n):
+    dictionary = {}
+    for i in range(n):
+        t = model.Type(name="T%d" % (i % (n // 10)))
+        t.register("doc", SCOPE[:i % len(SCOPE)], dictionary)
+    return dictionary
+
+
+def cases():
+    overloads = make_overloads(500)
+    functions = {"function": overloads}
+    types = {"type": make_types(5000)}
+    pattern = parsing_sphinxstring.parse_signaturestring(
+        "a0::Int64, a1::Float64, a2::AbstractString")
+    matcher = query.SignatureMatcher(pattern)
+    signature = parsing_sphinxstring.parse_signaturestring(
+        "a0::Int64, a1::Float64, a2::AbstractString; k=1")
+    normalized = signature.normalized()
+    parsefunction = parsing_sphinxstring.parsers["function"]
+    parsesignature = parsing_sphinxstring.parsers["signature"]
+    return {
+        "parse_functionstring_long_parametric":
+            lambda: parsefunction(LONG_PARAMETRIC),
+        "parse_signaturestring_nested":
+            lambda: parsesignature(NESTED),
+        "resolvescope_deep":
+            lambda: query.resolvescope(SCOPE, "........A.B.C.d"),
+        "find_object_by_string_deep_scope":
+            lambda: query.find_object_by_string(
+                "type", SCOPE[:30], "..T7", types),
+        "find_object_by_string_overloads":
+            lambda: query.find_object_by_string(
+                "function", [], "Outer.Inner1.f(a0::Int64, a1, a2)",
+                functions),
+        "find_object_by_string_overloads_unqualified":
+            lambda: query.find_object_by_string(
+                "function", ["Outer"], "f(,,; k=1)", functions),
+        # Arity and keyword only patterns against all 500 overloads
+        "find_object_by_string_overloads_arity":
+            lambda: query.find_object_by_string(
+                "function", [], "f(,,)", functions),
+        "find_object_by_string_overloads_keyword":
+            lambda: query.find_object_by_string(
+                "function", [], "f(; k=1)", functions),
+        "match_signature":
+            lambda: query.match_signature(pattern, signature),
+        "match_signature_compiled":
+            lambda: matcher.match(normalized),
+    }
+
+
+def measure(f, repeat=7):
+    timer = timeit.Timer(f)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(names=None):
+    reference = measure(calibration)
+    results = {}
+    for name, f in sorted(cases().items()):
+        if names and name not in names:
+            continue
+        results[name] = measure(f) / reference
+    return reference, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cases", nargs="*", help="only run these cases")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if a case regressed")
+    parser.add_argument("--update", action="store_true",
+                        help="write the results as new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed relative slowdown (default: 0.5)")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    reference, results = run(args.cases)
+
+    print("calibration loop: {:.1f} us".format(reference * 1e6))
+    print("{:48s} {:>10s} {:>10s} {:>8s}".format(
+        "case", "relative", "baseline", "change"))
+    regressions = []
+    for name, value in sorted(results.items()):
+        baseline = baselines.get(name)
+        if baseline is None:
+            print("{:48s} {:10.4f} {:>10s} {:>8s}".format(name, value, "-", "-"))
+            continue
+        change = value / baseline - 1
+        print("{:48s} {:10.4f} {:10.4f} {:+7.0%}".format(
+            name, value, baseline, change))
+        if change > args.tolerance:
+            regressions.append(name)
+
+    if args.update:
+        baselines.update((name, float("%.4g" % value))
+                         for name, value in results.items())
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.check and regressions:
+        print("Regressions beyond {:.0%}: {}".format(
+            args.tolerance, ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,4 +11,9 @@ setup(name='Sphinx-Julia',
       license='MIT',
       packages=['sphinxjulia'],
       package_data={'sphinxjulia': ['parsetools/*/*.jl']},
+      entry_points={
+          'console_scripts': [
+              'sphinxjulia-parse = sphinxjulia.snapshot:main',
+          ],
+      },
      )
@@ -0,0 +1,73 @@
+"""
+Caches shared by several parts of the extension.
+"""
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Mapping holding at most maxsize entries. When it is full the least
+    recently used entry is dropped.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        value = self.data[key]
+        self.data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        self.resize(self.maxsize)
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def get(self, key, default=None):
+        if key in self.data:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return default
+
+    def get_or_create(self, key, create):
+        """
+        Return the cached value for key. On a miss the value is obtained by
+        calling create() and stored.
+        """
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            value = create()
+            self[key] = value
+            return value
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        if maxsize is not None:
+            while len(self.data) > maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+
+# Rendered signature and header fragments, keyed by output format and the
+# canonical key of the rendered object.
+rendered = LRUCache(maxsize=8192)
@@ -0,0 +1,135 @@
+"""
+Julia objects of other projects loaded from their Sphinx inventories.
+
+The objects are stored in dictionaries with the same layout as the domain
+data of the julia domain so that the functions in query can be used to
+look them up.
+"""
+import posixpath
+import time
+from collections import namedtuple
+
+from sphinx.util import logging
+logger = logging.getLogger(__name__)
+
+from . import model, parsing_sphinxstring
+
+
+# Like model.FunctionEntry with the location of the object in the other
+# project. Entries of non-function objects have no templateparameters and
+# signature.
+InventoryEntry = namedtuple("InventoryEntry", ["docname", "scope", "uid",
+                                               "templateparameters",
+                                               "signature", "uri",
+                                               "project", "version"])
+
+objtypes = ("module", "abstract", "type", "function")
+
+
+class Inventory:
+
+    def __init__(self):
+        # objtype -> name -> [InventoryEntry, ...]
+        self.dictionaries = {objtype: {} for objtype in objtypes}
+
+    def __len__(self):
+        return sum(len(entries) for dictionary in self.dictionaries.values()
+                   for entries in dictionary.values())
+
+    def add(self, objtype, name, project, version, uri, dispname):
+        templateparameters = signature = None
+        if objtype == "function":
+            # The display name carries the full signature
+            pattern = parsing_sphinxstring.parse("function", dispname)
+            scope = pattern.modulename.split(".") if pattern.modulename else []
+            name = pattern.name
+            templateparameters = tuple(pattern.templateparameters)
+            signature = pattern.signature.normalized()
+        else:
+            scope = name.split(".")
+            name = scope.pop()
+        entry = InventoryEntry(None, model.intern_scope(scope),
+                               uri.rsplit("#", 1)[-1], templateparameters,
+                               signature, uri, project, version)
+        self.dictionaries[objtype].setdefault(name, []).append(entry)
+
+    def update(self, items):
+        """
+        Add the objects given as tuples like the ones returned by
+        julia_items.
+        """
+        for item in items:
+            try:
+                self.add(*item)
+            except ValueError:
+                logger.warning("Can't parse julia inventory entry "
+                               "{!r}".format(item[-1]))
+
+
+def julia_items(invdata):
+    """
+    Julia objects of an inventory as returned by
+    sphinx.ext.intersphinx.fetch_inventory given as list of tuples
+    (objtype, name, project, version, uri, dispname).
+    """
+    items = []
+    for invtype, objects in invdata.items():
+        domain, objtype = invtype.split(":", 1)
+        if domain != "jl" or objtype not in objtypes:
+            continue
+        for name, item in objects.items():
+            if hasattr(item, "display_name"):
+                items.append((objtype, name, item.project_name,
+                              item.project_version, item.uri,
+                              item.display_name))
+            else:
+                # Plain tuples before Sphinx 8.2
+                project, version, uri, dispname = item
+                items.append((objtype, name, project, version, uri,
+                              dispname))
+    return items
+
+
+def fetch(app, name, uri, inv):
+    from sphinx.ext.intersphinx import fetch_inventory
+    try:
+        invdata = fetch_inventory(app, uri, inv)
+    except Exception as e:
+        # Older Sphinx versions return None instead of raising
+        logger.warning("Julia inventory {} could not be loaded: "
+                       "{}".format(name, e))
+        return None
+    if not invdata:
+        logger.warning("Julia inventory {} could not be loaded".format(name))
+    return invdata
+
+
+def load(app):
+    """
+    Load the inventories given in julia_inventories, a mapping from a name
+    to a tuple (uri, inventory location) like intersphinx_mapping.
+
+    The julia objects of remote inventories are kept in the environment
+    and fetched again after intersphinx_cache_limit days. Local files are
+    read on every build, like intersphinx does.
+    """
+    # (uri, inventory location) -> (fetch time, julia_items)
+    cache = getattr(app.env, "juliainventory_cache", {})
+    app.env.juliainventory_cache = newcache = {}
+    now = int(time.time())
+    limit = app.config.intersphinx_cache_limit
+    inventory = Inventory()
+    for name, (uri, inv) in sorted(app.config.julia_inventories.items()):
+        if inv is None:
+            inv = posixpath.join(uri, "objects.inv")
+        cached = cache.get((uri, inv))
+        if cached is None or "://" not in inv or\
+                (limit >= 0 and cached[0] < now - limit * 86400):
+            invdata = fetch(app, name, uri, inv)
+            if invdata:
+                cached = (now, julia_items(invdata))
+            elif cached is None:
+                continue
+        newcache[(uri, inv)] = cached
+        inventory.update(cached[1])
+    return inventory
@@ -1,6 +1,13 @@
+import hashlib
+import io
+import json
 import os
+import pickle
+from collections import OrderedDict
 
 from docutils import nodes
+from docutils.parsers.rst import directives
+from sphinx import addnodes
 from sphinx.directives import ObjectDescription
 from docutils.statemachine import ViewList
 from sphinx.util.docfields import Field, GroupedField, TypedField
@@ -9,9 +16,176 @@ try:
     from sphinx.locale import l_
 except ImportError:
     from sphinx.locale import _ as l_
+from sphinx.application import ENV_PICKLE_FILENAME
 from sphinx.errors import SphinxError
+from sphinx.util import logging
+logger = logging.getLogger(__name__)
+
+from . import caching, memory, model, parsing_juliacode, query, snapshot
+from . import sourcetree, splitting
+from .profiling import profiled
+from .tracing import tracer
+
+
+class Collector:
+    """
+    Finds the julia objects documented by an autodoc directive.
+
+    Besides the directive itself it is used where the objects are needed
+    outside of a document, see objects_changed and generate_subpages.
+    """
+    # Directive used on the pages the output is split into
+    memberdirective = "jl:autofile"
+
+    def __init__(self, env, name, arguments, options):
+        self.env = env
+        self.name = name
+        self.arguments = arguments
+        self.options = options
+        if ':' in name:
+            self.domain, self.objtype = name.split(':', 1)
+        else:
+            self.domain, self.objtype = '', name
+        self.objtype = self.objtype[len("auto"):]
+        sourcedir = env.app.config.juliaautodoc_basedir
+        self.sourcepath = os.path.join(sourcedir, arguments[0])
+        self.sourcepaths = [self.sourcepath]
+        if 'module' in options:
+            self.modulepath = options['module'].split('.')
+        else:
+            self.modulepath = []
+
+    def collect(self):
+        """
+        Parse the source files and store the documented julia objects in
+        self.matches and their scopes within the file in self.scopes.
+        """
+        self.matches = []
+        self.scopes = []
 
-from . import model, parsing_juliacode, parsing_sphinxstring, query
+        # Load all julia objects from file
+        modulenode = self.submodule(self.load())
+        # Store nodes matching the search pattern in self.matches
+        self.filter(modulenode)
+
+    def uptodate(self, digests):
+        for sourcepath, digest in digests:
+            if sourcehash(self.env, sourcepath) != digest:
+                return False
+        self.sourcepaths = [sourcepath for sourcepath, digest in digests
+                            if not sourcepath.startswith(listing)]
+        return True
+
+    def sources(self):
+        """
+        Paths of the julia files the output depends on, as used as keys of
+        env.juliaautodoc_sources.
+        """
+        return [os.path.realpath(p) for p in self.sourcepaths]
+
+    def load(self):
+        return self.env.juliaparser.parsefile(self.sourcepath)
+
+    def submodule(self, modulenode):
+        for name in self.modulepath:
+            for node in modulenode.children:
+                if isinstance(node, model.Module) and node.name == name:
+                    modulenode = node
+                    break
+            else:
+                raise ValueError('No module "{}" in file "{}"'.format(
+                    ".".join(self.modulepath), self.arguments[0]))
+        return modulenode
+
+    def filter(self, modulenode):
+        self.matcher = query.compile_string(self.objtype, self.arguments[1])
+        if self.modulepath:
+            # Only direct members of the given module
+            for node in modulenode.children:
+                self.match(node, self.modulepath)
+        else:
+            query.walk_tree(modulenode, self.match, scope=[])
+
+    def match(self, node, scope):
+        if self.matcher.match(node):
+            self.add(node, scope)
+
+    def add(self, node, scope):
+        self.matches.append(node.deepcopy())
+        self.scopes.append(list(scope))
+
+    def splitting(self):
+        if 'split' in self.options:
+            return True
+        return self.env.app.config.juliaautodoc_split\
+            and 'nosplit' not in self.options
+
+    def members(self):
+        """
+        Group the documented objects by the page they are split into.
+
+        Matched modules stay on the page and their members are split off,
+        all other objects are moved to a page per name. Returns a list of
+        (module or None, OrderedDict {(scope, name): [nodes]}).
+        """
+        result = []
+        for node, scope in zip(self.matches, self.scopes):
+            if isinstance(node, model.Module):
+                groups = OrderedDict()
+                scope = tuple(scope + [node.name])
+                for member in node.children:
+                    groups.setdefault((scope, member.name), []).append(member)
+                result.append((node, groups))
+            else:
+                if not result or result[-1][0] is not None:
+                    result.append((None, OrderedDict()))
+                key = (tuple(scope), node.name)
+                result[-1][1].setdefault(key, []).append(node)
+        return result
+
+    def subpages(self):
+        """
+        Docnames and content of the pages the output is split into.
+        """
+        directory = self.env.app.config.juliaautodoc_split_dir
+        pages = OrderedDict()
+        for module, groups in self.members():
+            for (scope, name), members in groups.items():
+                split = any(isinstance(x, model.Module) for x in members)
+                docname = splitting.pagename(directory, scope, name)
+                block = splitting.stub(self.memberdirective, self.arguments[0],
+                                       scope, members[0], split)
+                pages[docname] = (splitting.title(scope, name), block)
+        return pages
+
+
+class FileCollector(Collector):
+
+    def filter(self, modulenode):
+        # Take all elements of file
+        member = self.options.get('member')
+        for node in modulenode.children:
+            if member is None or node.name == member:
+                self.add(node, self.modulepath)
+
+
+class PackageCollector(FileCollector):
+    memberdirective = "jl:autopackage"
+
+    def load(self):
+        self.sourcepaths = sourcetree.discover(self.sourcepath)
+        if not self.sourcepaths:
+            raise ValueError('No julia files found for directive "{}" at '
+                             '"{}"'.format(self.objtype, self.arguments[0]))
+        jobs = self.env.app.config.juliaautodoc_jobs
+        models = sourcetree.parse(self.env.juliaparser, self.sourcepaths, jobs)
+        self.sourcepaths = list(models)
+        return sourcetree.assemble(sorted(models), models)
+
+    def sources(self):
+        # Files added to the package later have to be noticed as well
+        return FileCollector.sources(self)\
+            + [listing + os.path.abspath(self.sourcepath)]
 
 
 class AutoDirective(ObjectDescription):
@@ -19,6 +193,12 @@ class AutoDirective(ObjectDescription):
     required_arguments = 2
     optional_arguments = 0
     final_argument_whitespace = False
+    option_spec = dict(ObjectDescription.option_spec,
+                       module=directives.unchanged_required,
+                       member=directives.unchanged_required,
+                       split=directives.flag,
+                       nosplit=directives.flag)
+    collectorclass = Collector
 
     doc_field_types = [
         TypedField('parameter', label=l_('Parameters'),
@@ -38,51 +218,165 @@ class AutoDirective(ObjectDescription):
               names=('rtype',), bodyrolename='obj'),
     ]
 
+    @profiled(lambda self: self.env.docname)
     def run(self):
-        if ':' in self.name:
-            self.domain, self.objtype = self.name.split(':', 1)
-        else:
-            self.domain, self.objtype = '', self.name
-        self.objtype = self.objtype[len("auto"):]
-        sourcedir = self.env.app.config.juliaautodoc_basedir
-        self.sourcepath = os.path.join(sourcedir, self.arguments[0])
-        self.matches = []
-
-        # Load all julia objects from file
-        modulenode = self.env.juliaparser.parsefile(self.sourcepath)
-        # Store nodes matching the search pattern in self.matches
-        self.filter(modulenode)
-        if len(self.matches) == 0:
+        with tracer.span("autodoc", "directive", docname=self.env.docname,
+                         directive=self.name, arguments=self.arguments):
+            return self.run_directive()
+
+    def run_directive(self):
+        self.configure()
+        results = self.env.juliaautodoc_results
+        if results.maxsize:
+            key = self.resultkey()
+            entry = results.get(key)
+            if entry is not None and self.collector.uptodate(entry[0]):
+                result = self.restore(entry[1])
+                self.objectdigest = entry[2]
+                self.note_dependencies()
+                return result
+
+        collector = self.collector
+        collector.collect()
+        if len(collector.matches) == 0:
             args = self.arguments
             raise ValueError('No matches for directive "{}" in '
                              ' file "{}" with arguments {}'.format(
                                     self.objtype, args[0], str(args[1:])))
+        self.objectdigest = model.contentdigest((collector.matches,
+                                                 collector.scopes))
 
-        scope = self.env.ref_context.get('jl:scope', [])
-        for node in self.matches:
-            # Set ids and register nodes in global index
+        scope = self.env.ref_context.get('jl:scope', [])\
+            + collector.modulepath
+        if collector.splitting():
+            result = self.split(scope)
+        else:
+            result = collector.matches
+            for node in collector.matches:
+                # Set ids and register nodes in global index
+                query.walk_tree(node, self.register, scope)
+                # Add docstrings
+                query.walk_tree(node, self.docstring, scope)
+
+        self.note_dependencies()
+        if results.maxsize:
+            digests = tuple((p, sourcehash(self.env, p))
+                            for p in collector.sources())
+            results[key] = (digests, dumps(result, self.state.document),
+                            self.objectdigest)
+
+        return result
+
+    def configure(self):
+        self.collector = self.collectorclass(self.env, self.name,
+                                             self.arguments, self.options)
+        # Used by DocFieldTransformer for the docstrings
+        self.domain = self.collector.domain
+        self.objtype = self.collector.objtype
+
+    def resultkey(self):
+        return (self.name, tuple(self.arguments),
+                tuple(sorted(self.options.items())),
+                tuple(self.env.ref_context.get('jl:scope', [])),
+                self.env.juliaautodoc_configdigest)
+
+    def restore(self, data):
+        """
+        Reuse the nodes rendered for the same directive before. Only the
+        ids and the registration in the domain data are redone.
+        """
+        result = loads(data, self.state.document)
+        docname = self.env.docname
+        for node in result:
+            for xref in node.traverse(addnodes.pending_xref):
+                xref['refdoc'] = docname
+            for toctree in node.traverse(addnodes.toctree):
+                toctree['parent'] = docname
+        scope = self.env.ref_context.get('jl:scope', [])\
+            + self.collector.modulepath
+        for node in result:
             query.walk_tree(node, self.register, scope)
-            # Add docstrings
-            query.walk_tree(node, self.docstring, scope)
-
-        self.state.document.settings.record_dependencies.add(self.sourcepath)
-
-        return self.matches
-
-    def filter(self, modulenode):
-        self.pattern = parsing_sphinxstring.parse(self.objtype, self.arguments[1])
-        query.walk_tree(modulenode, self.match, scope=[])
-
-    def match(self, node, scope):
-        if query.match(self.pattern, node):
-            self.matches.append(node.deepcopy())
+        return result
+
+    def note_dependencies(self):
+        # Instead of registering the source files as regular dependencies
+        # (which are compared by modification time) remember their content
+        # hash and the digest of the documented objects, see get_outdated.
+        sources = self.env.juliaautodoc_sources
+        for sourcepath in self.collector.sources():
+            docnames = sources.setdefault(sourcepath, {})
+            docnames[self.env.docname] = sourcehash(self.env, sourcepath)
+        objects = self.env.juliaautodoc_objects.setdefault(self.env.docname,
+                                                           [])
+        objects.append((self.name, tuple(self.arguments),
+                        tuple(sorted(self.options.items())),
+                        self.objectdigest))
+
+    def split(self, scope):
+        directory = self.env.app.config.juliaautodoc_split_dir
+        result = []
+        for module, groups in self.collector.members():
+            table = self.summary(directory, groups)
+            if module is None:
+                result.extend(table)
+                continue
+            module.children = []
+            query.walk_tree(module, self.register, scope)
+            query.walk_tree(module, self.docstring, scope)
+            module.extend(table)
+            result.append(module)
+        return result
+
+    def summary(self, directory, groups):
+        """
+        Table linking to the pages of the given groups of objects together
+        with a hidden toctree containing them.
+        """
+        table = nodes.table(classes=["longtable"])
+        tgroup = nodes.tgroup(cols=2)
+        table += tgroup
+        tgroup += nodes.colspec(colwidth=30)
+        tgroup += nodes.colspec(colwidth=70)
+        tbody = nodes.tbody()
+        tgroup += tbody
+        docnames = []
+        for (scope, name), members in groups.items():
+            docname = splitting.pagename(directory, scope, name)
+            docnames.append(docname)
+            reference = addnodes.pending_xref(
+                '', refdomain='std', reftype='doc', reftarget='/' + docname,
+                refdoc=self.env.docname, refexplicit=True)
+            reference += nodes.literal(name, name)
+            description = nodes.paragraph()
+            text = splitting.summaryline(members)
+            if text:
+                textnodes, messages = self.state.inline_text(text, self.lineno)
+                description.extend(textnodes)
+            row = nodes.row()
+            row += nodes.entry('', nodes.paragraph('', '', reference))
+            row += nodes.entry('', description)
+            tbody += row
+
+        toctree = addnodes.toctree()
+        toctree['parent'] = self.env.docname
+        toctree['entries'] = [(None, docname) for docname in docnames]
+        toctree['includefiles'] = docnames
+        toctree['maxdepth'] = -1
+        toctree['caption'] = None
+        toctree['glob'] = False
+        toctree['hidden'] = True
+        toctree['includehidden'] = False
+        toctree['numbered'] = 0
+        toctree['titlesonly'] = False
+        return [table, toctree]
 
     def register(self, node, scope):
         if isinstance(node, model.JuliaModelNode):
             objtype = type(node).__name__.lower()
             node["ids"] = [node.uid(scope)]
-            dictionary = self.env.domaindata['jl'][objtype]
-            node.register(self.env.docname, scope, dictionary)
+            dictionaries = self.env.domaindata['jl']
+            node.register(self.env.docname, scope, dictionaries[objtype])
+            node.register_parenttype(self.env.docname, scope, dictionaries)
 
     def docstring(self, node, scope):
         docstringlines = node.docstring.split("\n")
@@ -90,19 +384,26 @@ class AutoDirective(ObjectDescription):
                           'class', node["ids"][0], node, {}, docstringlines)
         content = ViewList(docstringlines)
         docstringnode = nodes.paragraph()
-        self.state.nested_parse(content, self.content_offset,
-                                docstringnode)
+        with tracer.span("nested_parse", "directive", uid=node["ids"][0]):
+            self.state.nested_parse(content, self.content_offset,
+                                    docstringnode)
         DocFieldTransformer(self).transform_all(docstringnode)
         node.insert(0, docstringnode)
 
 
 class AutoFileDirective(AutoDirective):
     required_arguments = 1
+    collectorclass = FileCollector
 
-    def filter(self, modulenode):
-        # Take all elements of file
-        for node in modulenode.children:
-            self.matches.append(node.deepcopy())
+
+class AutoPackageDirective(AutoFileDirective):
+    """
+    Document all files of a package (or matching a glob pattern).
+
+    The files are parsed concurrently and combined following their
+    include statements.
+    """
+    collectorclass = PackageCollector
 
 
 class AutoModuleDirective(AutoDirective):
@@ -121,8 +422,88 @@ class AutoAbstract(AutoDirective):
     pass
 
 
+class _Pickler(pickle.Pickler):
+    # The document the nodes belong to is replaced by the one of the
+    # directive they are restored in.
+
+    def __init__(self, file, document):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.document = document
+
+    def persistent_id(self, obj):
+        return "document" if obj is self.document else None
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, document):
+        pickle.Unpickler.__init__(self, file)
+        self.document = document
+
+    def persistent_load(self, pid):
+        return self.document
+
+
+def dumps(nodelist, document):
+    f = io.BytesIO()
+    _Pickler(f, document).dump(nodelist)
+    return f.getvalue()
+
+
+def loads(data, document):
+    return _Unpickler(io.BytesIO(data), document).load()
+
+
+autodirectives = OrderedDict([
+    ('jl:autofile', AutoFileDirective),
+    ('jl:autopackage', AutoPackageDirective),
+    ('jl:automodule', AutoModuleDirective),
+    ('jl:autofunction', AutoFunctionDirective),
+    ('jl:autotype', AutoType),
+    ('jl:autoabstract', AutoAbstract),
+])
+
+
 def update_builder(app):
-    app.env.juliaparser = parsing_juliacode.JuliaParser()
+    config = app.config
+    # Reuse the parser (and its cache) restored with the environment
+    parser = getattr(app.env, "juliaparser", None)
+    if not isinstance(getattr(parser, "cached_files", None),
+                      parsing_juliacode.FileCache):
+        parser = parsing_juliacode.JuliaParser()
+    parser.cached_files.resize(config.juliaautodoc_cache_maxentries,
+                               config.juliaautodoc_cache_maxbytes)
+    parser.use_worker = config.juliaautodoc_watch or config.juliaautodoc_warmup
+    if config.juliaautodoc_warmup:
+        parser.warmup()
+    parser.snapshot = None
+    if config.juliaautodoc_snapshot:
+        path = os.path.join(app.confdir, config.juliaautodoc_snapshot)
+        try:
+            parser.snapshot = snapshot.load(path)
+        except (OSError, ValueError) as e:
+            logger.warn("Can't read julia snapshot {}, all files are parsed "
+                        "by julia: {}".format(path, e))
+        else:
+            if parser.snapshot is None:
+                logger.warn("Ignoring julia snapshot {} written by a "
+                            "different version of sphinxjulia".format(path))
+    app.env.juliaparser = parser
+    if not hasattr(app.env, "juliaautodoc_sources"):
+        # sourcepath -> {docname: content hash at the time it was read}
+        app.env.juliaautodoc_sources = {}
+    if not hasattr(app.env, "juliaautodoc_objects"):
+        # docname -> [(directive, arguments, options, digest of the
+        #              documented objects), ...]
+        app.env.juliaautodoc_objects = {}
+    if not hasattr(app.env, "juliaautodoc_results"):
+        # Rendered directives: key -> (content hashes of the sources, nodes,
+        #                               digest of the documented objects)
+        app.env.juliaautodoc_results = caching.LRUCache()
+    app.env.juliaautodoc_results.resize(config.juliaautodoc_cache_results)
+    app.env.juliaautodoc_configdigest = None
+    if config.juliaautodoc_cache_results:
+        app.env.juliaautodoc_configdigest = configdigest(config)
     # translator = app.builder.translator_class
     # translator.first_kwordparam = True
     # _visit_desc_parameterlist = translator.visit_desc_parameterlist
@@ -132,16 +513,215 @@ def update_builder(app):
     # translator.visit_desc_parameterlist = visit_desc_parameterlist
 
 
+def configdigest(config):
+    """
+    Hash of all config values which may change the output of a directive.
+    """
+    values = []
+    for name, value in sorted(config.values.items()):
+        # Newer Sphinx versions store the registered values as objects,
+        # older ones as (default, rebuild, types) tuples.
+        rebuild = getattr(value, 'rebuild', None)
+        if rebuild is None:
+            rebuild = value[1]
+        if rebuild == 'env' or name.startswith('julia'):
+            values.append((name, repr(getattr(config, name))))
+    return hashlib.sha1(repr(values).encode("utf-8")).hexdigest()
+
+
+# Prefix of the entries of env.juliaautodoc_sources which stand for the list
+# of files found for a package (or glob pattern) instead of a single file.
+listing = "listing:"
+
+
+def sourcehash(env, sourcepath):
+    """
+    Content hash of a julia file, None if it doesn't exist. For listing
+    entries the hash of the list of files found for the pattern.
+    """
+    if sourcepath.startswith(listing):
+        paths = sourcetree.discover(sourcepath[len(listing):])
+        return hashlib.sha1("\n".join(paths).encode("utf-8")).hexdigest()
+    if not os.path.exists(sourcepath):
+        return None
+    return env.juliaparser.contenthash(sourcepath)
+
+
+def collector(env, name, arguments, options):
+    """
+    Collector finding the objects of the given autodoc directive.
+    """
+    cls = autodirectives[name].collectorclass
+    return cls(env, name, arguments, options)
+
+
+def generate_subpages(app):
+    """
+    Write the pages the output of split autodoc directives is moved to.
+    """
+    env = app.env
+    config = app.config
+    directory = config.juliaautodoc_split_dir
+    queue = []
+    for docname in sorted(env.found_docs):
+        if not docname.startswith(directory + "/"):
+            with io.open(env.doc2path(docname), encoding="utf-8") as f:
+                queue.append(f.read())
+    pages = OrderedDict()
+    while queue:
+        text = queue.pop(0)
+        for name, argumentstring, options in splitting.scan(text):
+            cls = autodirectives.get(name)
+            if cls is None:
+                continue
+            arguments = argumentstring.split(None, cls.required_arguments - 1)
+            objects = collector(env, name, arguments, options)
+            if not objects.splitting():
+                continue
+            try:
+                objects.collect()
+            except (ValueError, parsing_juliacode.ParseError):
+                # Reported when the document itself is read
+                continue
+            for docname, (title, block) in objects.subpages().items():
+                title, blocks = pages.setdefault(docname, (title, []))
+                if block not in blocks:
+                    blocks.append(block)
+                    # Split modules are split again on their own page
+                    queue.append(block)
+    if pages or os.path.isdir(os.path.join(app.srcdir, directory)):
+        # Newer Sphinx versions return path objects which don't compare
+        # equal to the strings of os.listdir used by splitting.write.
+        texts = OrderedDict((os.fspath(env.doc2path(docname)),
+                             splitting.pagetext(title, blocks))
+                            for docname, (title, blocks) in pages.items())
+        suffix = next(iter(config.source_suffix))
+        splitting.write(os.path.join(app.srcdir, directory), texts, suffix)
+
+
+def get_outdated(app, env, added, changed, removed):
+    """
+    Documents showing julia objects which changed since they were read.
+
+    Documents using a file whose content changed are only outdated if one
+    of their directives now finds different objects.
+    """
+    # Sphinx < 2.0 passes the builder instead of the environment
+    env = app.env
+    # docname -> {sourcepath: new content hash}
+    candidates = {}
+    for sourcepath, docnames in env.juliaautodoc_sources.items():
+        digest = sourcehash(env, sourcepath)
+        for docname, olddigest in docnames.items():
+            if olddigest != digest:
+                candidates.setdefault(docname, {})[sourcepath] = digest
+    outdated = set()
+    for docname, digests in sorted(candidates.items()):
+        if docname in removed:
+            continue
+        if None in digests.values() or objects_changed(env, docname):
+            outdated.add(docname)
+            continue
+        # Nothing shown changed, only the file hashes are updated.
+        for sourcepath, digest in digests.items():
+            env.juliaautodoc_sources[sourcepath][docname] = digest
+        env.juliaautodoc_unsaved = True
+    return sorted(outdated)
+
+
+def note_reading(app, env, docnames):
+    if docnames:
+        # Sphinx saves the environment itself after reading documents
+        env.juliaautodoc_unsaved = False
+
+
+def save_environment(app, env):
+    """
+    Save the environment if only the file hashes were updated.
+
+    Sphinx doesn't save it if no document was read, the next build would
+    otherwise compare the files with the old hashes and parse them again.
+    """
+    if not getattr(env, "juliaautodoc_unsaved", False):
+        return []
+    env.juliaautodoc_unsaved = False
+    path = os.path.join(env.doctreedir, ENV_PICKLE_FILENAME)
+    with open(path, "wb") as f:
+        pickle.dump(env, f, pickle.HIGHEST_PROTOCOL)
+    return []
+
+
+def objects_changed(env, docname):
+    records = env.juliaautodoc_objects.get(docname)
+    if records is None:
+        return True
+    for name, arguments, options, digest in records:
+        objects = collector(env, name, list(arguments), dict(options))
+        try:
+            objects.collect()
+        except (ValueError, parsing_juliacode.ParseError):
+            return True
+        matches = (objects.matches, objects.scopes)
+        if not objects.matches or model.contentdigest(matches) != digest:
+            return True
+    return False
+
+
+def purge_doc(app, env, docname):
+    for docnames in env.juliaautodoc_sources.values():
+        docnames.pop(docname, None)
+    env.juliaautodoc_objects.pop(docname, None)
+
+
+def merge_info(app, env, docnames, other):
+    for sourcepath, otherdocnames in other.juliaautodoc_sources.items():
+        sources = env.juliaautodoc_sources.setdefault(sourcepath, {})
+        for docname in docnames:
+            if docname in otherdocnames:
+                sources[docname] = otherdocnames[docname]
+    for docname in docnames:
+        if docname in other.juliaautodoc_objects:
+            env.juliaautodoc_objects[docname] = \
+                other.juliaautodoc_objects[docname]
+    results = env.juliaautodoc_results
+    for key, entry in other.juliaautodoc_results.data.items():
+        if key not in results:
+            results[key] = entry
+
+
+def write_stats(app, exception):
+    if exception is not None or not app.config.juliaautodoc_stats:
+        return
+    parser = getattr(app.env, "juliaparser", None)
+    if parser is None:
+        return
+    stats = parser.stats()
+    results = app.env.juliaautodoc_results
+    stats["results"] = {"entries": len(results), "hits": results.hits,
+                        "misses": results.misses}
+    path = os.path.join(app.outdir, "juliaautodoc-stats.json")
+    with open(path, "w") as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+
+
 def setup(app):
     # Config values
     app.add_config_value('juliaautodoc_basedir', '..', 'html')
+    app.add_config_value('juliaautodoc_jobs', None, '')
+    app.add_config_value('juliaautodoc_cache_maxentries', None, '')
+    app.add_config_value('juliaautodoc_cache_maxbytes', 64*2**20, '')
+    app.add_config_value('juliaautodoc_stats', False, '')
+    app.add_config_value('juliaautodoc_watch', False, '')
+    app.add_config_value('juliaautodoc_warmup', False, '')
+    app.add_config_value('juliaautodoc_memory', False, '')
+    app.add_config_value('juliaautodoc_cache_results', 0, '')
+    app.add_config_value('juliaautodoc_snapshot', None, '')
+    app.add_config_value('juliaautodoc_split', False, 'env')
+    app.add_config_value('juliaautodoc_split_dir', 'jl', 'env')
 
     # Directives
-    app.add_directive('jl:autofile', AutoFileDirective)
-    app.add_directive('jl:automodule', AutoModuleDirective)
-    app.add_directive('jl:autofunction', AutoFunctionDirective)
-    app.add_directive('jl:autotype', AutoType)
-    app.add_directive('jl:autoabstract', AutoAbstract)
+    for name, directive in autodirectives.items():
+        app.add_directive(name, directive)
 
     # Events (These may already have been added by the regular Sphinx
     # autodoc extension)
@@ -151,4 +731,17 @@ def setup(app):
     if 'autodoc-skip-member' not in app.events.events:
         app.add_event('autodoc-skip-member')
 
+    app.connect('builder-inited', memory.start)
     app.connect('builder-inited', update_builder)
+    app.connect('builder-inited', generate_subpages)
+    app.connect('builder-inited', memory.after_init)
+    app.connect('env-updated', memory.after_read)
+    app.connect('env-get-outdated', get_outdated)
+    app.connect('env-before-read-docs', note_reading)
+    app.connect('env-updated', save_environment)
+    app.connect('env-purge-doc', purge_doc)
+    app.connect('env-merge-info', merge_info)
+    app.connect('build-finished', write_stats)
+    app.connect('build-finished', memory.finish)
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
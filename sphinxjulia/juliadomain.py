@@ -1,12 +1,15 @@
+import posixpath
+
 from docutils import nodes
 from docutils.parsers.rst import Directive
+from docutils.utils import relative_path
 
 from sphinx import addnodes
 try:
     from sphinx.locale import l_
 except ImportError:
     from sphinx.locale import _ as l_
-from sphinx.domains import Domain, ObjType
+from sphinx.domains import Domain, Index, ObjType
 from sphinx.roles import XRefRole
 from sphinx.util.nodes import make_refnode
 from sphinx.util.docfields import Field, GroupedField, TypedField
@@ -14,7 +17,11 @@ from sphinx.util.docfields import DocFieldTransformer
 from sphinx.util import logging
 logger = logging.getLogger(__name__)
 
-from . import model, parsing_sphinxstring, translators_html, translators_latex, query
+from . import model, parsing_sphinxstring, translators_html, translators_latex, query, inventory, tracing, typelinks
+from . import methods, signatures, suggestions, typetree
+from . import profiling
+from .profiling import profiled
+from .tracing import tracer
 
 
 class JuliaDirective(Directive):
@@ -25,6 +32,7 @@ class JuliaDirective(Directive):
 
     doc_field_types = []
 
+    @profiled(lambda self: self.state.document.settings.env.docname)
     def run(self):
         if ':' in self.name:
             self.domain, self.objtype = self.name.split(':', 1)
@@ -34,14 +42,23 @@ class JuliaDirective(Directive):
         modelnode = self.parse_arguments()
         scope = self.env.ref_context.get('jl:scope', [])
         docname = self.env.docname
-        dictionary = self.env.domaindata['jl'][self.objtype]
+        dictionaries = self.env.domaindata['jl']
         modelnode["ids"] = [modelnode.uid(scope)]
-        modelnode.register(docname, scope, dictionary)
+        modelnode.register(docname, scope, dictionaries[self.objtype])
+        modelnode.register_parenttype(docname, scope, dictionaries)
         self.parse_content(modelnode)
         DocFieldTransformer(self).transform_all(modelnode)
         return [modelnode]
 
     def parse_arguments(self):
+        # Signatures parsed by julia are shared, this node becomes part of
+        # the document and therefore needs to be a private copy.
+        if self.env.config.julia_parse_signatures\
+                and self.objtype in signatures.objtypes:
+            modelnode = signatures.lookup(self.env, self.objtype,
+                                          self.arguments[0])
+            if modelnode is not None:
+                return modelnode.deepcopy()
         return parsing_sphinxstring.parse(self.objtype, self.arguments[0])
 
     def parse_content(self, modelnode):
@@ -89,7 +106,9 @@ class Type(JuliaDirective):
 
 class JuliaXRefRole(XRefRole):
     def process_link(self, env, refnode, has_explicit_title, title, target):
-        refnode['jl:scope'] = list(env.ref_context.get('jl:scope', []))
+        # Equal scopes share one tuple, which is pickled only once
+        refnode['jl:scope'] = model.intern_scope(
+            env.ref_context.get('jl:scope', []))
         if not has_explicit_title:
             title = title.lstrip('.')    # only has a meaning for the target
             target = target.lstrip('~')  # only has a meaning for the title
@@ -103,12 +122,63 @@ class JuliaXRefRole(XRefRole):
         return title, target
 
 
+class JuliaModuleIndex(Index):
+    """
+    Index of all documented modules with the number of objects in each.
+    """
+    name = 'modindex'
+    localname = l_('Julia Module Index')
+    shortname = l_('modules')
+
+    def generate(self, docnames=None):
+        dictionaries = self.domain.data
+        # Number of documented objects directly in every module
+        counts = {}
+        for objtype in ('abstract', 'type', 'function', 'module'):
+            for entries in dictionaries[objtype].values():
+                for entry in entries:
+                    counts[entry.scope] = counts.get(entry.scope, 0) + 1
+        # qualified name -> entry, modules documented more than once are
+        # listed with their first definition
+        modules = {}
+        for name, entries in dictionaries['module'].items():
+            for entry in entries:
+                if docnames and entry.docname not in docnames:
+                    continue
+                modules.setdefault(entry.scope + (name,), entry)
+
+        content = {}
+        toplevels = 0
+        previous = None
+        for scope in sorted(modules, key=lambda x: [y.lower() for y in x]):
+            entry = modules[scope]
+            entries = content.setdefault(scope[0][0].lower(), [])
+            if len(scope) > 1:
+                # Submodules are collapsed under their top level module
+                if previous is None or previous[0] != scope[0]:
+                    entries.append([scope[0], 1, '', '', '', '', ''])
+                elif len(previous) == 1:
+                    entries[-1][1] = 1
+                subtype = 2
+            else:
+                toplevels += 1
+                subtype = 0
+            count = counts.get(scope, 0)
+            extra = '1 object' if count == 1 else '{} objects'.format(count)
+            entries.append(['.'.join(scope), subtype, entry.docname,
+                            entry.uid, extra, '', ''])
+            previous = scope
+        collapse = len(modules) - toplevels < toplevels
+        return sorted(content.items()), collapse
+
+
 class JuliaDomain(Domain):
     """
     Julia language domain.
     """
     name = 'jl'
     label = 'Julia'
+    data_version = 3
     object_types = {
         'function': ObjType(l_('function'), 'func'),
         'type': ObjType(l_('type'), 'type'),
@@ -121,6 +191,8 @@ class JuliaDomain(Domain):
         'abstract': Abstract,
         'type': Type,
         'module': Module,
+        'typetree': typetree.TypeTree,
+        'methods': methods.Methods,
     }
 
     roles = {
@@ -131,44 +203,115 @@ class JuliaDomain(Domain):
     }
 
     initial_data = {
-        # name -> [{docname, scope, uid}, ...]
+        # name -> [model.ObjectEntry, ...]
         "module": {},
         "abstract": {},
         "type": {},
-        # name -> [{docname, scope, templateparameters, signature, uid}]
+        # name -> [model.FunctionEntry, ...]
         "function": {},
+        # short name of the parent type -> [model.SubtypeEntry, ...]
+        "subtypes": {},
+        # uid -> [model.SubtypeEntry]
+        "supertypes": {},
+        # name given to jl:typetree -> [model.ObjectEntry, ...]
+        "typetrees": {},
+        # name given to jl:methods -> [model.ObjectEntry, ...]
+        "methodtables": {},
     }
     indices = [
-        # JuliaModuleIndex,
+        JuliaModuleIndex,
     ]
 
-    def find_obj(self, rolename, node, targetstring):
+    def find_obj(self, rolename, node, targetstring, dictionaries=None):
         for typename, objtype in self.object_types.items():
             if rolename in objtype.roles:
                 break
         else:
             return []
         basescope = node['jl:scope']
-        dictionaries = self.env.domaindata['jl']
+        if dictionaries is None:
+            dictionaries = self.env.domaindata['jl']
         return query.find_object_by_string(typename, basescope,
                                            targetstring, dictionaries)
 
+    @profiled(lambda self, env, fromdocname, *args: fromdocname)
     def resolve_xref(self, env, fromdocname, builder,
                      typ, target, node, contnode):
+        with tracer.span("resolve_xref", "domain", docname=fromdocname,
+                         role=typ, target=target):
+            return self._resolve_xref(env, fromdocname, builder,
+                                      typ, target, node, contnode)
+
+    def _resolve_xref(self, env, fromdocname, builder,
+                      typ, target, node, contnode):
         matches = self.find_obj(typ, node, target)
         if not matches:
-            
-            logger.warn('No target found for cross-reference ' + str(target))
+            inventory = getattr(env, 'juliainventory', None)
+            if inventory is not None:
+                matches = self.find_obj(typ, node, target,
+                                        inventory.dictionaries)
+                if matches:
+                    return self.make_external_refnode(matches[0], fromdocname,
+                                                      contnode)
+            message = 'No target found for cross-reference ' + str(target)
+            if env.config.julia_suggestions:
+                objtype = self.objtypes_for_role(typ)[0]
+                candidates = suggestions.suggest(env, objtype, target)
+                if candidates:
+                    message += '; did you mean {}?'.format(
+                        ', '.join(candidates))
+            logger.warn(message)
             return None
         elif len(matches) > 1:
             logger.warn(
                 'more than one target found for cross-reference '
-                '%r: %s' % (target, ', '.join(match["uid"] for match in matches)))
+                '%r: %s' % (target, ', '.join(match.uid for match in matches)))
         match = matches[0]
         return make_refnode(builder, fromdocname,
-                            match["docname"], match["uid"],
+                            match.docname, match.uid,
                             contnode, target)
 
+    def make_external_refnode(self, match, fromdocname, contnode):
+        uri = match.uri
+        if '://' not in uri:
+            # Local inventories are given relative to the output root
+            uri = posixpath.join(relative_path(fromdocname, '.'), uri)
+        if match.version:
+            reftitle = '(in %s v%s)' % (match.project, match.version)
+        else:
+            reftitle = '(in %s)' % match.project
+        refnode = nodes.reference('', '', internal=False, refuri=uri,
+                                  reftitle=reftitle)
+        refnode.append(contnode)
+        return refnode
+
+    def get_objects(self):
+        dictionaries = self.env.domaindata['jl']
+        for objtype in self.object_types:
+            for name, entries in dictionaries[objtype].items():
+                for entry in entries:
+                    qualifiedname = ".".join(entry.scope + (name,))
+                    if objtype == "function":
+                        # Methods share their name, the signature in the
+                        # display name tells them apart.
+                        dispname = parsing_sphinxstring.format_functionstring(
+                            qualifiedname, entry.templateparameters,
+                            entry.signature)
+                        yield (entry.uid, dispname, objtype,
+                               entry.docname, entry.uid, 1)
+                    else:
+                        yield (qualifiedname, qualifiedname, objtype,
+                               entry.docname, entry.uid, 1)
+
+    def merge_domaindata(self, docnames, otherdata):
+        dictionaries = self.env.domaindata['jl']
+        for dicname in self.initial_data.keys():
+            dictionary = dictionaries[dicname]
+            for name, methods in otherdata[dicname].items():
+                methods = [m for m in methods if m.docname in docnames]
+                if methods:
+                    dictionary.setdefault(name, []).extend(methods)
+
     def clear_doc(self, docname):
         dictionaries = self.env.domaindata['jl']
         for dicname in self.initial_data.keys():
@@ -176,7 +319,7 @@ class JuliaDomain(Domain):
             for name, methods in dictionary.items():
                 items_to_delete = []
                 for i, m in enumerate(methods):
-                    if m["docname"] == docname:
+                    if m.docname == docname:
                         items_to_delete.insert(0, i)
                 for i in items_to_delete:
                     methods.pop(i)
@@ -197,3 +340,48 @@ def setup(app):
                      latex=latextranslator,
                      )
     app.add_domain(JuliaDomain)
+    # fetch_inventory used for julia_inventories reads the intersphinx
+    # config values
+    app.setup_extension('sphinx.ext.intersphinx')
+    app.add_node(typetree.typetree)
+    app.add_node(methods.methodtable)
+    app.add_post_transform(typetree.TypeTreeResolver)
+    app.add_post_transform(methods.MethodTableResolver)
+
+    app.add_config_value('julia_inventories', {}, 'env')
+    app.add_config_value('julia_trace', False, '')
+    app.add_config_value('julia_profile', [], '')
+    app.add_config_value('julia_suggestions', False, '')
+    app.add_config_value('julia_parse_signatures', False, 'env')
+    app.connect('builder-inited', load_inventories)
+    app.connect('builder-inited', register_modindex_label)
+    app.connect('builder-inited', tracing.start)
+    app.connect('builder-inited', profiling.start)
+    app.connect('doctree-read', profiling.doctree_read)
+    app.connect('env-get-outdated', typetree.dependents.before_read)
+    app.connect('env-get-outdated', methods.dependents.before_read)
+    app.connect('env-before-read-docs', signatures.prepare)
+    app.connect('env-updated', typelinks.clear)
+    app.connect('env-updated', suggestions.clear)
+    app.connect('env-updated', typetree.dependents.after_read)
+    app.connect('env-updated', methods.dependents.after_read)
+    app.connect('doctree-resolved', profiling.doctree_resolved)
+    app.connect('build-finished', tracing.finish)
+    app.connect('build-finished', profiling.finish)
+
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
+
+
+def load_inventories(app):
+    app.env.juliainventory = inventory.load(app)
+
+
+def register_modindex_label(app):
+    # Older Sphinx versions only register a label for the python module
+    # index, without it :ref:`jl-modindex` can't be resolved.
+    labels = app.env.domaindata['std']['labels']
+    anonlabels = app.env.domaindata['std']['anonlabels']
+    name = JuliaDomain.name + '-' + JuliaModuleIndex.name
+    if name not in labels:
+        labels[name] = (name, '', JuliaModuleIndex.localname)
+        anonlabels[name] = (name, '')
@@ -0,0 +1,207 @@
+"""
+Optional report of the memory used by the extension.
+
+At a few points of the build the memory retained by the parsed julia files,
+the domain data, the julia nodes in the doctrees and the render cache is
+measured by walking their object graphs. Together with the allocation
+sites recorded by tracemalloc this shows which part of the extension (and
+which files and symbols) dominate the memory usage of a build.
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+import types
+
+from docutils import nodes
+
+from . import caching, model
+
+# Objects which are shared by everything and therefore never counted
+_shared = (type, types.ModuleType, types.FunctionType, types.MethodType,
+           types.BuiltinFunctionType, types.CodeType)
+# Attributes of docutils nodes pointing upwards in the tree
+_upwards = ("parent", "document", "_document")
+
+packagedir = os.path.dirname(os.path.realpath(__file__))
+
+
+def graphsize(obj, seen=None):
+    """
+    Approximate number of bytes used by obj and all objects reachable from
+    it. Objects in seen (ids) are skipped, which allows to measure several
+    objects without counting shared parts twice.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _shared):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, nodes.Node):
+            attributes = vars(obj)
+            size += sys.getsizeof(attributes)
+            stack.extend(value for name, value in attributes.items()
+                         if name not in _upwards)
+        else:
+            stack.extend(gc.get_referents(obj))
+    return size
+
+
+def largest(sizes, count):
+    """
+    The count largest entries of the dict sizes as sorted list of dicts.
+    """
+    items = sorted(sizes.items(), key=lambda x: x[1], reverse=True)
+    return [{"name": name, "bytes": size} for name, size in items[:count]]
+
+
+def measure_cache(parser, count):
+    sizes = {}
+    seen = set([id(parser.cached_files)])
+    for sourcepath, entry in list(parser.cached_files.entries.items()):
+        sizes[sourcepath] = graphsize(entry, seen)
+    return {
+        "bytes": sum(sizes.values()),
+        "files": len(sizes),
+        "largest": largest(sizes, count),
+    }
+
+
+def measure_domain(domaindata, count):
+    objtypes = {}
+    names = {}
+    seen = set()
+    for objtype, dictionary in domaindata.items():
+        if not isinstance(dictionary, dict):
+            objtypes[objtype] = graphsize(dictionary, seen)
+            continue
+        total = sys.getsizeof(dictionary)
+        for name, entries in dictionary.items():
+            size = graphsize(name, seen) + graphsize(entries, seen)
+            names[objtype + " " + name] = size
+            total += size
+        objtypes[objtype] = total
+    return {
+        "bytes": sum(objtypes.values()),
+        "objtypes": objtypes,
+        "largest": largest(names, count),
+    }
+
+
+def measure_doctrees(env, count):
+    """
+    Size of the julia nodes in all doctrees and of the pickled doctrees.
+    """
+    documents = {}
+    symbols = {}
+    pickled = 0
+    for docname in sorted(env.all_docs):
+        path = os.path.join(env.doctreedir, docname + '.doctree')
+        if not os.path.exists(path):
+            continue
+        pickled += os.path.getsize(path)
+        doctree = env.get_doctree(docname)
+        seen = set()
+        size = 0
+        for node in doctree.traverse(model.JuliaModelNode):
+            if isinstance(node.parent, model.JuliaModelNode):
+                # Already counted with its parent
+                continue
+            nodesize = graphsize(node, seen)
+            size += nodesize
+            uid = node["ids"][0] if node["ids"] else node.name
+            symbols[docname + ": " + uid] = nodesize
+        documents[docname] = size
+    return {
+        "bytes": sum(documents.values()),
+        "pickled": pickled,
+        "largest_documents": largest(documents, count),
+        "largest_symbols": largest(symbols, count),
+    }
+
+
+class Report:
+
+    def __init__(self):
+        self.checkpoints = []
+        self.count = 10
+        self.started = False
+
+    def start(self):
+        self.checkpoints = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+
+    def checkpoint(self, name, env, doctrees=False):
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        ours = snapshot.filter_traces([
+            tracemalloc.Filter(True, os.path.join(packagedir, "*"))])
+        subsystems = {
+            "rendercache": {"bytes": graphsize(caching.rendered.data),
+                            "entries": len(caching.rendered)},
+        }
+        parser = getattr(env, "juliaparser", None)
+        if parser is not None:
+            subsystems["cache"] = measure_cache(parser, self.count)
+        if "jl" in env.domaindata:
+            subsystems["domain"] = measure_domain(env.domaindata["jl"],
+                                                  self.count)
+        if doctrees:
+            subsystems["doctrees"] = measure_doctrees(env, self.count)
+        self.checkpoints.append({
+            "event": name,
+            "traced": current,
+            "peak": peak,
+            "allocations": self.statistics(snapshot),
+            "extension_allocations": self.statistics(ours),
+            "subsystems": subsystems,
+        })
+
+    def statistics(self, snapshot):
+        return [{"location": "{}:{}".format(stat.traceback[0].filename,
+                                            stat.traceback[0].lineno),
+                 "bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:self.count]]
+
+    def finish(self, path):
+        with open(path, "w") as f:
+            json.dump({"checkpoints": self.checkpoints}, f, indent=2)
+        self.checkpoints = []
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+
+report = Report()
+
+
+def start(app):
+    if app.config.juliaautodoc_memory:
+        report.start()
+
+
+def after_init(app):
+    # Split pages and the warmup may already have parsed files
+    if app.config.juliaautodoc_memory:
+        report.checkpoint("inited", app.env)
+
+
+def after_read(app, env):
+    if app.config.juliaautodoc_memory:
+        report.checkpoint("read", env, doctrees=True)
+
+
+def finish(app, exception):
+    if exception is not None or not app.config.juliaautodoc_memory:
+        return
+    report.checkpoint("resolved", app.env)
+    report.finish(os.path.join(app.outdir, "juliaautodoc-memory.json"))
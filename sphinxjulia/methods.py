@@ -0,0 +1,80 @@
+"""
+The ``jl:methods`` directive listing all documented methods of a function.
+
+Like ``jl:typetree`` the directive leaves a placeholder which is replaced
+after all documents are read, so that methods documented on other pages
+are included. The methods are taken from the name-keyed function index of
+the domain data.
+"""
+from docutils import nodes
+from docutils.parsers.rst import Directive
+
+from sphinx.transforms import SphinxTransform
+from sphinx.util import logging
+from sphinx.util.nodes import make_refnode
+
+from . import model, parsing_sphinxstring, placeholders, query
+
+logger = logging.getLogger(__name__)
+
+dependents = placeholders.Dependents("methodtables", ("function",))
+
+
+class methodtable(nodes.General, nodes.Element):
+    """
+    Placeholder for the list of methods of the function named target.
+    """
+
+
+class Methods(Directive):
+    required_arguments = 1
+    optional_arguments = 0
+    final_argument_whitespace = True
+
+    def run(self):
+        env = self.state.document.settings.env
+        target = self.arguments[0]
+        scope = model.intern_scope(env.ref_context.get('jl:scope', []))
+        dependents.register(env, target, scope)
+        node = methodtable(target=target, scope=scope)
+        node.source, node.line = \
+            self.state_machine.get_source_and_line(self.lineno)
+        return [node]
+
+
+def sortkey(entry):
+    """
+    Order methods by arity first and then by their argument types.
+    """
+    arguments, varargs, keywordarguments, kwvarargs = entry.signature
+    return (len(arguments), varargs is not None,
+            tuple(x[1] for x in arguments), entry.uid)
+
+
+class MethodTableResolver(SphinxTransform):
+    default_priority = 20
+
+    def apply(self):
+        for node in self.document.traverse(methodtable):
+            matches = query.find_object_by_string(
+                "function", node['scope'], node['target'],
+                self.env.domaindata['jl'])
+            if not matches:
+                logger.warning('No methods found for ' + node['target'],
+                               location=node)
+                node.replace_self([])
+                continue
+            name = query.compile_string("function", node['target']).name
+            items = [self.item(name, entry)
+                     for entry in sorted(matches, key=sortkey)]
+            node.replace_self(nodes.bullet_list('', *items,
+                                                classes=['jl-methods']))
+
+    def item(self, name, entry):
+        qualifiedname = ".".join(entry.scope + (name,))
+        text = parsing_sphinxstring.format_functionstring(
+            qualifiedname, entry.templateparameters, entry.signature)
+        reference = make_refnode(self.app.builder, self.env.docname,
+                                 entry.docname, entry.uid,
+                                 nodes.literal(text, text), text)
+        return nodes.list_item('', nodes.paragraph('', '', reference))
@@ -3,12 +3,82 @@ from __future__ import unicode_literals
 from docutils import nodes
 
 import hashlib
+import sys
+from collections import namedtuple
 
 try:
     str = unicode
 except:
     pass
 
+# Records stored in the domain data for every registered object. The scope
+# is an interned tuple, the signature of functions is given in the
+# normalized form returned by Signature.normalized.
+ObjectEntry = namedtuple("ObjectEntry", ["docname", "scope", "uid"])
+FunctionEntry = namedtuple("FunctionEntry", ["docname", "scope", "uid",
+                                             "templateparameters",
+                                             "signature"])
+# Types and abstract types with a parent type, parenttype is the name of
+# the parent as written in the source without type parameters.
+SubtypeEntry = namedtuple("SubtypeEntry", ["docname", "scope", "uid",
+                                           "parenttype"])
+
+_scopes = {}
+
+
+def intern_scope(scope):
+    """
+    Return a canonical tuple for the given scope, equal scopes share the
+    same tuple (and strings).
+    """
+    scope = tuple(scope)
+    try:
+        return _scopes[scope]
+    except KeyError:
+        pass
+    scope = tuple(sys.intern(x) for x in scope)
+    _scopes[scope] = scope
+    return scope
+
+
+def parentname(parenttype):
+    """
+    Name of a parent type without its parameters, e.g. ``A.Op`` for
+    ``A.Op{T, 2}``.
+    """
+    return parenttype.split("{", 1)[0].strip()
+
+
+def _rebuild(cls, values):
+    obj = cls.__new__(cls)
+    for fieldname, value in zip(cls.__fields__, values):
+        setattr(obj, fieldname, value)
+    return obj
+
+
+def _rebuild_node(cls, values):
+    obj = _rebuild(cls, values)
+    nodes.Element.__init__(obj)
+    return obj
+
+
+def contentkey(obj):
+    """
+    Nested tuple of everything stored in the given model objects, used to
+    detect changes of single objects in a file.
+    """
+    if isinstance(obj, JuliaModel):
+        return (type(obj).__name__,) + tuple(
+            contentkey(getattr(obj, name)) for name in obj.__fields__)
+    if isinstance(obj, (list, tuple)):
+        return tuple(contentkey(x) for x in obj)
+    return obj
+
+
+def contentdigest(obj):
+    return hashlib.sha1(repr(contentkey(obj)).encode("utf-8")).hexdigest()
+
+
 class JuliaModel:
     __fields__ = None
 
@@ -41,6 +111,12 @@ class JuliaModel:
                 kwargs[fieldname] = attr
         return self.__class__(**kwargs)
 
+    def __reduce__(self):
+        # Pickled as plain tuple of the field values in __fields__ order,
+        # cached values like the normalized signature are recomputed.
+        values = tuple(getattr(self, name) for name in self.__fields__)
+        return (_rebuild, (type(self), values))
+
 
 class JuliaModelNode(JuliaModel, nodes.Element):
 
@@ -51,24 +127,60 @@ class JuliaModelNode(JuliaModel, nodes.Element):
     def uid(self, scope):
         return ".".join(scope + [self.name])
 
+    def key(self):
+        """
+        Hashable tuple identifying everything shown in the header of the
+        rendered object.
+        """
+        return (type(self).__name__.lower(), self.name,
+                tuple(getattr(self, "templateparameters", ())),
+                getattr(self, "parenttype", ""))
+
     def register(self, docname, scope, dictionary):
         if self.name in dictionary:
             entries = dictionary[self.name]
         else:
             entries = []
             dictionary[self.name] = entries
-        entry = {
-            "docname": docname,
-            "scope": list(scope),
-            "uid": self.uid(scope)
-        }
+        entry = ObjectEntry(docname, intern_scope(scope), self.uid(scope))
         entries.append(entry)
 
+    def register_parenttype(self, docname, scope, dictionaries):
+        """
+        Add types with a parent type to the "subtypes" (short name of the
+        parent -> entries) and "supertypes" (uid -> entries) indexes.
+        """
+        parenttype = parentname(getattr(self, "parenttype", ""))
+        if not parenttype:
+            return
+        entry = SubtypeEntry(docname, intern_scope(scope), self.uid(scope),
+                             parenttype)
+        shortname = parenttype.rsplit(".", 1)[-1]
+        dictionaries["subtypes"].setdefault(shortname, []).append(entry)
+        dictionaries["supertypes"].setdefault(entry.uid, []).append(entry)
+
+    def __reduce__(self):
+        values = tuple(getattr(self, name) for name in self.__fields__)
+        # Only the node state differing from a new Element is stored
+        state = {}
+        for name, value in self.__dict__.items():
+            if name in self.__fields__ or value is None or value == "":
+                continue
+            if name == "attributes":
+                value = {k: v for k, v in value.items() if v != []}
+            state[name] = value
+        return (_rebuild_node, (type(self), values), state)
+
+    def __setstate__(self, state):
+        attributes = state.pop("attributes", {})
+        self.__dict__.update(state)
+        # Nodes pickled by older versions come with their complete state
+        self.__dict__.setdefault("attributes", {}).update(attributes)
+
     def deepcopy(self):
         obj = JuliaModel.deepcopy(self)
         obj["ids"] = list(self["ids"])
-        obj.children = [c for c in self.children]
-        #obj.parent = self.parent
+        obj.extend(c.deepcopy() for c in self.children)
         return obj
 
 
@@ -90,6 +202,55 @@ class Signature(JuliaModel):
             + [self.varargs] + [";"] + self.keywordarguments + [self.kwvarargs]
         return str([str(x) for x in l])
 
+    def normalized(self):
+        """
+        Tuple (arguments, varargs, keywordarguments, kwvarargs) where every
+        argument is given as (name, argumenttype, value) tuple.
+
+        This is all the information needed for matching signatures. The
+        result is computed only once, the signature therefore must not be
+        changed afterwards.
+        """
+        try:
+            return self._normalized
+        except AttributeError:
+            pass
+        arguments = self.positionalarguments + self.optionalarguments
+        self._normalized = (
+            tuple(_argumentkey(x) for x in arguments),
+            _argumentkey(self.varargs),
+            tuple(_argumentkey(x) for x in self.keywordarguments),
+            _argumentkey(self.kwvarargs),
+        )
+        return self._normalized
+
+    def key(self):
+        """
+        Hashable tuple containing all details of the signature.
+        """
+        arguments = self.positionalarguments + self.optionalarguments
+        return (
+            tuple(_fullargumentkey(x) for x in arguments),
+            _fullargumentkey(self.varargs),
+            tuple(_fullargumentkey(x) for x in self.keywordarguments),
+            _fullargumentkey(self.kwvarargs),
+        )
+
+
+def _fullargumentkey(argument):
+    if argument is None:
+        return None
+    return (argument.name, argument.argumenttype, argument.value,
+            argument.macrocall)
+
+
+def _argumentkey(argument):
+    if argument is None:
+        return None
+    # Interning lets pickle store repeated names and types only once
+    return (sys.intern(argument.name), sys.intern(argument.argumenttype),
+            sys.intern(argument.value))
+
 
 class Function(JuliaModelNode):
     __fields__ = {"name": str, "modulename": str, "templateparameters": list,
@@ -108,15 +269,15 @@ class Function(JuliaModelNode):
         else:
             entries = []
             dictionary[self.name] = entries
-        entry = {
-            "docname": docname,
-            "scope": list(scope),
-            "templateparameters": self.templateparameters,
-            "signature": self.signature,
-            "uid": self.uid(scope),
-        }
+        entry = FunctionEntry(docname, intern_scope(scope), self.uid(scope),
+                              tuple(self.templateparameters),
+                              self.signature.normalized())
         entries.append(entry)
 
+    def key(self):
+        return ("function", self.name, tuple(self.templateparameters),
+                self.signature.key(), self.returntype)
+
 
 class Field(JuliaModel):
     __fields__ = {"name": str, "fieldtype": str, "value": str}
@@ -130,6 +291,19 @@ class Type(JuliaModelNode):
         JuliaModelNode.__init__(self, **kwargs)
         self.extend(self.constructors)
 
+    def deepcopy(self):
+        # The constructors are given by the current children, which are
+        # copied too. Passing the original list would add (and re-parent)
+        # the cached constructor nodes.
+        obj = Type(name=self.name,
+                   templateparameters=list(self.templateparameters),
+                   parenttype=self.parenttype,
+                   fields=[f.deepcopy() for f in self.fields],
+                   constructors=[c.deepcopy() for c in self.children],
+                   docstring=self.docstring)
+        obj["ids"] = list(self["ids"])
+        return obj
+
 
 CompositeType = Type
 
@@ -139,9 +313,21 @@ class Abstract(JuliaModelNode):
                   "docstring": str}
 
 
+class Include(JuliaModel):
+    __fields__ = {"path": str, "position": int}
+
+
 class Module(JuliaModelNode):
-    __fields__ = {"name": str, "body":list, "docstring": str}
+    __fields__ = {"name": str, "body":list, "docstring": str, "includes": list}
 
     def __init__(self, **kwargs):
         JuliaModelNode.__init__(self, **kwargs)
         self.extend(self.body)
+
+    def deepcopy(self):
+        # The body is given by the current children, which are copied too
+        obj = Module(name=self.name,
+                     body=[c.deepcopy() for c in self.children],
+                     docstring=self.docstring, includes=self.includes)
+        obj["ids"] = list(self["ids"])
+        return obj
@@ -0,0 +1,9 @@
+include("../src/parsetools.jl")
+
+@static if VERSION < v"0.7.0"
+    stdout = STDOUT
+end
+
+sourcepath = ARGS[1]
+models = parsetools.reader.read_strings(sourcepath)
+print(stdout, parsetools.writer.python_list(models))
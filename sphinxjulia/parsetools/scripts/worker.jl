@@ -0,0 +1,45 @@
+include("../src/parsetools.jl")
+
+@static if VERSION < v"0.7.0"
+    stdin = STDIN
+    stdout = STDOUT
+    stderr = STDERR
+end
+
+# Answers are written to the original stdout only. Anything else printed
+# while parsing goes to stderr and can't corrupt the protocol.
+const protocol = stdout
+redirect_stdout(stderr)
+
+# Requests are read line by line from stdin and have the form
+# "<command> <argument>". Every answer consists of a line
+# "<status> <length>" followed by <length> bytes of data.
+function answer(status, text)
+    data = Vector{UInt8}(text)
+    println(protocol, status, " ", length(data))
+    write(protocol, data)
+    flush(protocol)
+end
+
+while !eof(stdin)
+    line = readline(stdin)
+    request = split(line, " "; limit=2)
+    if length(request) != 2
+        answer("ERROR", "Invalid request: " * line)
+        continue
+    end
+    command, argument = request
+    try
+        if command == "file"
+            m = parsetools.reader.read_file(argument)
+            answer("OK", string(m))
+        elseif command == "strings"
+            models = parsetools.reader.read_strings(argument)
+            answer("OK", parsetools.writer.python_list(models))
+        else
+            answer("ERROR", "Unknown command: " * command)
+        end
+    catch e
+        answer("ERROR", sprint(showerror, e))
+    end
+end
@@ -49,9 +49,15 @@ mutable struct CompositeType<: JuliaModel
     docstring::AbstractString
 end
 
+mutable struct Include<: JuliaModel
+    path::AbstractString
+    position::Int
+end
+
 mutable struct Module<: JuliaModel
     name::AbstractString
     body::Vector{Union{Module,Abstract,CompositeType,Function}}
     docstring::AbstractString
+    includes::Vector{Include}
 end
 
@@ -24,6 +24,14 @@ function isfunction(x)
     end
 end
 
+function isinclude(x)
+    if typeof(x) != Expr
+        return false
+    end
+    return x.head == :call && x.args[1] == :include &&
+        length(x.args) == 2 && typeof(x.args[2]) <: AbstractString
+end
+
 function isdocstring(x)
     if typeof(x) != Expr
         return false
@@ -285,8 +293,7 @@ function read_type(x::Expr, docstring::AbstractString)
         elseif arg.head == :let || arg.head == :macrocall || arg.head == :line
             # Won't support
         else
-            dump(arg)
-            error()
+            error("Unsupported expression in type $name: $arg")
         end
     end
     return model.CompositeType(name, templateparameters, supertype, fields, constructors, docstring)
@@ -296,6 +303,7 @@ function read_module(x::Expr, docstring::AbstractString)
     @assert x.head == :module
     name = string(x.args[2])
     body = Union{model.Module, model.Abstract, model.CompositeType, model.Function}[]
+    includes = model.Include[]
     @assert length(x.args) == 3
     @assert typeof(x.args[3]) == Expr
     @assert x.args[3].head == :block
@@ -316,6 +324,10 @@ function read_module(x::Expr, docstring::AbstractString)
             push!(body, func)
         elseif ismodule(arg)
             push!(body, read_module(arg, innerdocstring))
+        elseif isinclude(arg)
+            # Remember where the file is included so that the python side
+            # can splice its content into this module.
+            push!(includes, model.Include(arg.args[2], length(body)))
         elseif arg.head == :toplevel || arg.head == :typealias ||
                arg.head == :macro || arg.head == :const || arg.head == :importall ||
                arg.head == :export || arg.head == :import || arg.head == :global ||
@@ -327,12 +339,10 @@ function read_module(x::Expr, docstring::AbstractString)
                arg.head == Symbol("&&") || arg.head == :quote || arg.head == :line
             # Won't support
         else
-            println(arg)
-            println(arg.head)
-            error()
+            error("Unsupported expression $(arg.head): $arg")
         end
     end
-    model.Module(name, body, docstring)
+    model.Module(name, body, docstring, includes)
 end
 
 function read_file(sourcepath)
@@ -354,3 +364,33 @@ function read_file(sourcepath)
     # end
 end
 
+function read_string(objtype, text)
+    if objtype == "function"
+        code = "function $(text) end"
+    elseif objtype == "abstract"
+        code = "abstract type $(text) end"
+    elseif objtype == "type"
+        code = "struct $(text) end"
+    else
+        error("Unknown object type: " * objtype)
+    end
+    m = read_module(Meta.parse("module __temp__\n$(code)\nend"), "")
+    @assert length(m.body) == 1
+    return m.body[1]
+end
+
+# Every line of the file has the form "<objtype> <text>", e.g.
+# "function f(x::Int) where {T}". Returns one model per line, nothing for
+# the lines which couldn't be parsed.
+function read_strings(sourcepath)
+    results = Any[]
+    for line in eachline(sourcepath)
+        request = split(line, " "; limit=2)
+        try
+            push!(results, read_string(request[1], request[2]))
+        catch
+            push!(results, nothing)
+        end
+    end
+    return results
+end
@@ -27,3 +27,8 @@ end
 function write_python(f, m::model.JuliaModel)
     write(f, string(m))
 end
+
+function python_list(models)
+    items = [m == nothing ? "None" : string(m) for m in models]
+    return "[" * join(items, ", ") * "]"
+end
@@ -6,13 +6,21 @@ the JuliaModel in python.
 """
 from __future__ import unicode_literals
 
+import atexit
+import hashlib
 import os
 import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from sphinx.util import logging
 logger = logging.getLogger(__name__)
 
 from . import model
+from .tracing import tracer
 
 try:
     import julia
@@ -23,7 +31,11 @@ except ImportError:
 scriptdir = "parsetools/scripts"
 scripts = {
     "file": "sourcefile2pythonmodel.jl",
+    "strings": "strings2pythonmodel.jl",
+    "worker": "worker.jl",
 }
+# File parsed to make julia compile the parser ahead of time
+warmupfile = "parsetools/src/model.jl"
 eval_environment = {x: getattr(model, x) for x in dir(model) if not x.startswith("_")}
 
 class ParseError(Exception):
@@ -32,10 +44,218 @@ class ParseError(Exception):
         self.errormessage = errormessage
 
 
+def fingerprint(sourcepath):
+    """
+    Cheap identification of the current state of a file.
+    """
+    stat = os.stat(sourcepath)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileCache:
+    """
+    Parsed models of julia files.
+
+    Every entry remembers the fingerprint of the file at the time it was
+    parsed and is only returned as long as the file didn't change. If more
+    than maxentries files or more than maxbytes (measured as size of the
+    textual model representation returned by julia) are cached, the least
+    recently used entries are dropped.
+    """
+
+    def __init__(self, maxentries=None, maxbytes=None):
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, sourcepath):
+        return sourcepath in self.entries
+
+    def get(self, sourcepath, fingerprint):
+        with self.lock:
+            entry = self.entries.get(sourcepath)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != fingerprint:
+                self.stale += 1
+                self.misses += 1
+                self._remove(sourcepath)
+                return None
+            self.hits += 1
+            self.entries.move_to_end(sourcepath)
+            return entry[1]
+
+    def put(self, sourcepath, fingerprint, model, size):
+        with self.lock:
+            if sourcepath in self.entries:
+                self._remove(sourcepath)
+            self.entries[sourcepath] = (fingerprint, model, size)
+            self.nbytes += size
+            self.evict()
+
+    def resize(self, maxentries=None, maxbytes=None):
+        with self.lock:
+            self.maxentries = maxentries
+            self.maxbytes = maxbytes
+            self.evict()
+
+    def evict(self):
+        # Always keep the most recently added entry, even if it alone
+        # exceeds the budget.
+        while len(self.entries) > 1 and (
+                (self.maxentries is not None
+                 and len(self.entries) > self.maxentries)
+                or (self.maxbytes is not None
+                    and self.nbytes > self.maxbytes)):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, sourcepath):
+        entry = self.entries.pop(sourcepath)
+        self.nbytes -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "maxentries": self.maxentries,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+class JuliaWorker:
+    """
+    Julia process which is started once and then parses files on request.
+
+    Requests are written to its stdin as lines "<command> <argument>". The
+    answer is a line "<status> <length>" followed by <length> bytes of data.
+    There is only one such process, requests are answered one after
+    another. JuliaParser.parsefiles therefore doesn't use threads while
+    the worker is in use.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None\
+            and self.pid == os.getpid()
+
+    def start(self):
+        if self.pid != os.getpid():
+            # Forked (e.g. by a parallel build) - the pipes belong to the
+            # parent process.
+            self.process = None
+            self.lock = threading.Lock()
+        if self.running:
+            return
+        directory = os.path.dirname(os.path.realpath(__file__))
+        scriptpath = os.path.join(directory, scriptdir, scripts["worker"])
+        self.process = subprocess.Popen(["julia", scriptpath],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.pid = os.getpid()
+
+    def request(self, command, argument):
+        with self.lock:
+            self.start()
+            try:
+                line = "{} {}\n".format(command, argument)
+                self.process.stdin.write(line.encode("utf-8"))
+                self.process.stdin.flush()
+                header = self.process.stdout.readline().decode("utf-8").split()
+                if len(header) != 2:
+                    raise ValueError("Invalid answer header {!r}".format(
+                        " ".join(header)))
+                status, length = header[0], int(header[1])
+                data = self.process.stdout.read(length)
+                if len(data) != length:
+                    raise ValueError("Answer ended after {} of {} bytes".format(
+                        len(data), length))
+            except (OSError, ValueError) as e:
+                # The answers can't be told apart anymore, the process is
+                # replaced by a new one on the next request.
+                self.kill()
+                raise ParseError(argument, "Julia worker terminated "
+                                           "unexpectedly: {}".format(e))
+        text = data.decode("utf-8")
+        if status != "OK":
+            raise ParseError(argument, text)
+        return text
+
+    def kill(self):
+        if self.running:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def close(self):
+        if self.running:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+
+worker = JuliaWorker()
+atexit.register(worker.close)
+
+
 class JuliaParser:
-    cached_files = {}
     _julia = None
 
+    def __init__(self, maxentries=None, maxbytes=None):
+        self.cached_files = FileCache(maxentries, maxbytes)
+        # Parse with the long running julia worker instead of starting a
+        # new julia process for every file.
+        self.use_worker = False
+        self.digests = {}
+        # Signatures of directives parsed by julia:
+        # (objtype, text) -> model or None if julia couldn't parse it
+        self.strings = {}
+        # Models of files parsed ahead of time, see snapshot.py
+        self.snapshot = None
+        # Files currently parsed by some thread: sourcepath -> Event
+        self.inflight = {}
+        # Files which failed to parse: sourcepath -> (fingerprint, error)
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.failurehits = 0
+        self.warming = None
+        self.warmuptime = None
+        self.warmupwait = None
+
     @property
     def julia(self):
         if isinstance(self._julia, Exception):
@@ -50,35 +270,156 @@ class JuliaParser:
         return self._julia
 
     def parsefile(self, sourcepath):
+        """
+        Parse the file (or take it from the cache).
+
+        Concurrent requests for the same file wait for a single julia run.
+        A failure is remembered until the file changes and raised again
+        without running julia.
+        """
         sourcepath = os.path.realpath(sourcepath)
         if not os.path.exists(sourcepath):
             raise ValueError("Can't find file: " + sourcepath)
-        if sourcepath in self.cached_files:
-            return self.cached_files[sourcepath]
+        filestate = fingerprint(sourcepath)
+        while True:
+            model = self.cached_files.get(sourcepath, filestate)
+            if model is not None:
+                return model
+            with self.lock:
+                failure = self.failures.get(sourcepath)
+                if failure is not None:
+                    if failure[0] == filestate:
+                        self.failurehits += 1
+                        error = failure[1]
+                        raise ParseError(error.source, error.errormessage)
+                    del self.failures[sourcepath]
+                event = self.inflight.get(sourcepath)
+                if event is None:
+                    event = threading.Event()
+                    self.inflight[sourcepath] = event
+                    break
+                self.waits += 1
+            event.wait()
+        try:
+            model, size = self.readfile(sourcepath)
+        except ParseError as e:
+            with self.lock:
+                self.failures[sourcepath] = (filestate, e)
+            raise
+        else:
+            self.cached_files.put(sourcepath, filestate, model, size)
+        finally:
+            with self.lock:
+                del self.inflight[sourcepath]
+            event.set()
+        return model
+
+    def readfile(self, sourcepath):
+        with tracer.span("parsefile", "parser", path=sourcepath):
+            text = None
+            if self.snapshot is not None:
+                text = self.snapshot.get(self.contenthash(sourcepath))
+            if text is None:
+                text = self.readtext(sourcepath)
+            with tracer.span("decode", "parser", path=sourcepath):
+                model = eval(text, eval_environment)
+        return model, len(text)
+
+    def readtext(self, sourcepath):
+        """
+        Let julia parse the file and return the textual model.
+        """
         if self.julia:
-            return self.parsefile_pyjulia(sourcepath)
+            return self.readfile_pyjulia(sourcepath)
+        elif self.use_worker:
+            return self.readfile_worker(sourcepath)
         else:
-            return self.parsefile_script(sourcepath)
+            return self.readfile_script(sourcepath)
+
+    def parsefiles(self, sourcepaths, jobs=None):
+        """
+        Parse several files and return a dict mapping the real path of
+        every file to its model.
+
+        The files are parsed concurrently only if every file is parsed by
+        its own julia process. With PyJulia or the julia worker they are
+        parsed one after another.
+        """
+        sourcepaths = [os.path.realpath(p) for p in sourcepaths]
+        # PyJulia embeds a single julia runtime which can't be used from
+        # several threads at the same time. The worker answers one request
+        # after another, threads would only wait for its lock. Only
+        # separate julia processes started by readfile_script run in
+        # parallel.
+        if jobs == 1 or len(sourcepaths) < 2 or self.julia\
+                or self.use_worker:
+            return {p: self.parsefile(p) for p in sourcepaths}
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            models = list(executor.map(self.parsefile, sourcepaths))
+        return dict(zip(sourcepaths, models))
 
-    def parsefile_pyjulia(self, sourcepath):
+    def readfile_pyjulia(self, sourcepath):
         j = self.julia
         current_dir= os.path.dirname(os.path.realpath(__file__))
         parsetools_dir = os.path.join(current_dir, "parsetools/src/")
 
-        j.eval('push!(LOAD_PATH, "{}")'.format(parsetools_dir))
-        j.eval('using parsetools')
-        j.eval('model = parsetools.reader.read_file("{}")'.format(sourcepath))
-        text = j.eval('string(model)')
-        model = eval(text, eval_environment)
-        self.cached_files[sourcepath] = model
-        return model
+        with tracer.span("pyjulia", "parser", path=sourcepath):
+            j.eval('push!(LOAD_PATH, "{}")'.format(parsetools_dir))
+            j.eval('using parsetools')
+            j.eval('model = parsetools.reader.read_file("{}")'.format(sourcepath))
+            return j.eval('string(model)')
 
-    def parsefile_script(self, sourcepath):
+    def warmup(self):
+        """
+        Start the julia worker and let it compile the parser in a background
+        thread, so that this overlaps with the work done by Sphinx before
+        the first file is needed.
+        """
+        if self.warming is not None:
+            return
+        if julia is not None and self.julia is not None:
+            # A PyJulia session can only be used from the thread that
+            # created it, the parser is therefore compiled by the first
+            # file. Creating the session is the part done ahead of time.
+            return
+        self.warming = threading.Thread(target=self._warmup)
+        self.warming.daemon = True
+        self.warming.start()
+
+    def _warmup(self):
+        directory = os.path.dirname(os.path.realpath(__file__))
+        start = time.perf_counter()
+        with tracer.span("warmup", "parser"):
+            try:
+                worker.request("file", os.path.join(directory, warmupfile))
+            except (OSError, ParseError) as e:
+                logger.warn("Warming up julia failed: {}".format(e))
+        self.warmuptime = time.perf_counter() - start
+
+    def readfile_worker(self, sourcepath):
+        if self.warming is not None:
+            start = time.perf_counter()
+            self.warming.join()
+            waited = time.perf_counter() - start
+            with self.lock:
+                if self.warmupwait is None:
+                    self.warmupwait = waited
+        try:
+            with tracer.span("wait", "parser", path=sourcepath, worker=True):
+                return worker.request("file", sourcepath)
+        except ParseError as e:
+            logger.warning("Parsing file {} failed with error message:\n{}"
+                           .format(sourcepath, e.errormessage))
+            raise
+
+    def readfile_script(self, sourcepath):
         directory = os.path.dirname(os.path.realpath(__file__))
         scriptpath = os.path.join(directory, scriptdir, scripts["file"])
-        p = subprocess.Popen(["julia", scriptpath, sourcepath],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (buf, err) = p.communicate()
+        with tracer.span("spawn", "parser", path=sourcepath):
+            p = subprocess.Popen(["julia", scriptpath, sourcepath],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with tracer.span("wait", "parser", path=sourcepath, juliapid=p.pid):
+            (buf, err) = p.communicate()
         if p.returncode != 0:
             print("Parsing file {} failed with error message:".format(sourcepath))
             print("-"*80)
@@ -86,30 +427,123 @@ class JuliaParser:
             print("-"*80)
             raise ParseError(sourcepath, err)
         # buf is a bytestring in utf-8 encoding.
-        text = buf.decode("utf-8")
-        model = eval(text, eval_environment)
-        self.cached_files[sourcepath] = model
-        return model
+        return buf.decode("utf-8")
+
+    def parsestrings(self, items):
+        """
+        Parse all (objtype, text) pairs which are not cached yet with a
+        single julia run.
+
+        If the batch fails, the pairs are parsed one at a time by the worker
+        or PyJulia, pairs which still fail are remembered as not parsed.
+        Without either of them the error is raised.
+        """
+        pending = sorted(set(x for x in items if x not in self.strings))
+        if not pending:
+            return
+        try:
+            with tracer.span("parsestrings", "parser", count=len(pending)):
+                models = self.readstrings(pending)
+        except ParseError as e:
+            if not (self.julia or self.use_worker) or len(pending) == 1:
+                raise
+            logger.warn("Parsing signatures with julia in one batch "
+                           "failed, parsing them one at a time: {}".format(
+                               e.errormessage))
+            models = []
+            for item in pending:
+                try:
+                    models.extend(self.readstrings([item]))
+                except ParseError:
+                    models.append(None)
+        self.strings.update(zip(pending, models))
+
+    def readstrings(self, items):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False,
+                                         encoding="utf-8") as f:
+            for objtype, text in items:
+                f.write("{} {}\n".format(objtype, text))
+        try:
+            if self.julia:
+                text = self.readstrings_pyjulia(f.name)
+            elif self.use_worker:
+                text = worker.request("strings", f.name)
+            else:
+                text = self.readstrings_script(f.name)
+        finally:
+            os.remove(f.name)
+        try:
+            models = eval(text, eval_environment)
+        except Exception as e:
+            raise ParseError(f.name, "Invalid answer from julia: {}".format(e))
+        if not isinstance(models, list) or len(models) != len(items):
+            raise ParseError(f.name, "Expected {} models from julia".format(
+                len(items)))
+        return models
 
-    def parsestring(self, objtype, text):
+    def readstrings_pyjulia(self, path):
+        j = self.julia
+        current_dir = os.path.dirname(os.path.realpath(__file__))
+        parsetools_dir = os.path.join(current_dir, "parsetools/src/")
+        j.eval('push!(LOAD_PATH, "{}")'.format(parsetools_dir))
+        j.eval('using parsetools')
+        try:
+            j.eval('models = parsetools.reader.read_strings("{}")'.format(path))
+            return j.eval('parsetools.writer.python_list(models)')
+        except Exception as e:
+            raise ParseError(path, str(e))
+
+    def readstrings_script(self, path):
         directory = os.path.dirname(os.path.realpath(__file__))
-        scriptpath = os.path.join(directory, scriptdir, scripts[objtype])
-        p = subprocess.Popen(["julia", scriptpath, text],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             universal_newlines=True)
+        scriptpath = os.path.join(directory, scriptdir, scripts["strings"])
+        p = subprocess.Popen(["julia", scriptpath, path],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         (buf, err) = p.communicate()
-        if err:
-            print("Parsing {} from string:".format(objtype))
-            print("-"*80)
-            print(text)
-            print("-"*80)
-            print("failed with error message:")
-            print("-"*80)
-            print(err.decode("utf-8"))
-            print("-"*80)
-            raise ParseError(text, err)
-        model = eval(buf, eval_environment)
-        return model
+        if p.returncode != 0:
+            raise ParseError(path, err.decode("utf-8"))
+        return buf.decode("utf-8")
+
+    def parsedstring(self, objtype, text):
+        """
+        Model julia returned for the text by parsestrings, None if it wasn't
+        parsed (or julia failed to parse it).
+        """
+        return self.strings.get((objtype, text))
+
+    def contenthash(self, sourcepath):
+        """
+        Hash of the content of the file. It is only recomputed when the
+        fingerprint of the file changes.
+        """
+        sourcepath = os.path.realpath(sourcepath)
+        filestate = fingerprint(sourcepath)
+        if sourcepath in self.digests:
+            oldstate, digest = self.digests[sourcepath]
+            if oldstate == filestate:
+                return digest
+        with open(sourcepath, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.digests[sourcepath] = (filestate, digest)
+        return digest
+
+    def stats(self):
+        return {
+            "cache": self.cached_files.stats(),
+            "waits": self.waits,
+            "failures": len(self.failures),
+            "failurehits": self.failurehits,
+            "snapshot": self.snapshot.stats() if self.snapshot else None,
+            "strings": len(self.strings),
+            "warmup": {
+                "seconds": self.warmuptime,
+                # Time the first file had to wait for the warmup to finish
+                "waited": self.warmupwait,
+            },
+        }
 
     def __getstate__(self):
-        return {"cached_files": self.cached_files}
+        return {"cached_files": self.cached_files, "strings": self.strings}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
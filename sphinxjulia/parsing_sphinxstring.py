@@ -2,6 +2,8 @@
 Convert a string written for Sphinx to its corresponding JuliaModel.
 """
 
+from functools import lru_cache
+
 from . import model
 
 from sphinx.util import logging
@@ -14,15 +16,19 @@ def parse_modulestring(text):
 
 def typestring2dict(text):
     d = {}
-    if "<:" in text:
-        text, parenttype = text.split("<:", 1)
+    i_subtype = find_toplevel(text, "<:")
+    if i_subtype != -1:
+        text, parenttype = text[:i_subtype], text[i_subtype+2:]
         d["parenttype"] = parenttype.strip()
-    if "{" in text:
-        text, templ = text.split("{", 1)
-        templ = templ.strip()
-        assert templ[-1] == "}"
-        templateparameters = templ[:-1].split(",")
-        d["templateparameters"] = [t.strip() for t in templateparameters]
+    i_brace_open = text.find("{")
+    if i_brace_open != -1:
+        i_brace_close = match_brackets(text).get(i_brace_open, -1)
+        if i_brace_close != len(text.rstrip()) - 1:
+            raise ValueError("Failed parsing type string (Unbalanced braces):\n"
+                             + text)
+        templ = text[i_brace_open+1:i_brace_close]
+        d["templateparameters"] = split_parameters(templ)
+        text = text[:i_brace_open]
     d["name"] = text.strip()
     return d
 
@@ -35,13 +41,31 @@ def parse_typestring(text):
     return model.Type(**typestring2dict(text))
 
 
+def find_assignment(text):
+    """
+    Find the "=" separating an argument from its default value, i.e. the
+    first top-level "=" which isn't part of an operator like "==" or "=>".
+    """
+    i = find_toplevel(text, "=")
+    while i != -1:
+        if text[i+1:i+2] in ("=", ">"):
+            i = find_toplevel(text, "=", i + 2)
+        elif i > 0 and text[i-1] in "=!<>":
+            i = find_toplevel(text, "=", i + 1)
+        else:
+            break
+    return i
+
+
 def parse_argumentstring(text):
     d = {}
-    if "=" in text:
-        text, value = text.split("=", 1)
+    i_value = find_assignment(text) if "=" in text else -1
+    if i_value != -1:
+        text, value = text[:i_value], text[i_value+1:]
         d["value"] = value.strip()
-    if "::" in text:
-        text, argtype = text.split("::", 1)
+    i_type = find_toplevel(text, "::") if "::" in text else -1
+    if i_type != -1:
+        text, argtype = text[:i_type], text[i_type+2:]
         d["argumenttype"] = argtype.strip()
     return model.Argument(name=text.strip(), **d)
 
@@ -66,27 +90,13 @@ def parse_signaturestring(text):
         "keywordarguments": [],
     }
     argtype = "positionalarguments"
-    i_start = 0
-    i = 0
-    while i < len(text):
-        x = text[i]
-        if x in brackets:
-            i_closing = find_closing_bracket(text, i, x)
-            if i_closing == -1:
-                raise ValueError("Bracket '{}' opens at index {}."
-                                 "Couldn't find the closing bracket:\n{}"
-                                 "".format(x, i, repr(text)))
-            i = i_closing
-        elif x == ";":
-            _appendargument(d, text[i_start:i].strip(), argtype)
+    parts = split_toplevel(text, ",;")
+    for argstring, separator in parts[:-1]:
+        _appendargument(d, argstring.strip(), argtype)
+        if separator == ";":
             argtype = "keywordarguments"
-            i_start = i+1
-        elif x == ",":
-            _appendargument(d, text[i_start:i].strip(), argtype)
-            i_start = i+1
-        i += 1
     if text[-1] != ";":
-        _appendargument(d, text[i_start:].strip(), argtype)
+        _appendargument(d, parts[-1][0].strip(), argtype)
     return model.Signature(**d)
 
 
@@ -109,30 +119,39 @@ def parse_functionstring(text):
     if i_parentheses_open == -1:
         return model.Function(**d)
 
-    i_parentheses_close = find_closing_bracket(text, i_parentheses_open, "(")
+    pairs = match_brackets(text)
+    i_parentheses_close = pairs.get(i_parentheses_open, -1)
     if i_parentheses_close == -1:
         logger.error("Failed parsing function string (Unbalanced parentheses):\n" + text)
         raise ValueError("Failed parsing function string (Unbalanced parentheses)")
 
     d["signature"] = parse_signaturestring(text[i_parentheses_open+1:i_parentheses_close])
 
-    text = text[i_parentheses_close:]
-    i_where = text.find(" where ")
+    i_rest = i_parentheses_close + 1
+    i_where = text.find(" where ", i_rest)
     if i_where != -1:
-        i_brace_open = text.find("{", i_where)
-        if i_brace_open == -1:
-            logger.error("Failed parsing function string (Missing { after where clause):\n" + text)
-            raise ValueError("Failed parsing function string (Missing { after where clause)")
-        i_brace_close = find_closing_bracket(text, i_brace_open, "{")
-        if i_brace_close == -1:
-            logger.error("Failed parsing function string (Missing } after where clause):\n" + text)
-            raise ValueError("Failed parsing function string (Missing } after where clause)")
-        templateparameters = text[i_brace_open+1:i_brace_close].split(",")
-        d["templateparameters"] = [t.strip() for t in templateparameters]
-        text = text[:i_where]
-
-    if text.startswith("::"):
-        d["returntype"] = text[2:].strip()
+        i_parameters = i_where + len(" where ")
+        while text[i_parameters:i_parameters+1] == " ":
+            i_parameters += 1
+        if text[i_parameters:i_parameters+1] == "{":
+            i_brace_close = pairs.get(i_parameters, -1)
+            if i_brace_close == -1:
+                logger.error("Failed parsing function string (Missing } after where clause):\n" + text)
+                raise ValueError("Failed parsing function string (Missing } after where clause)")
+            parameters = text[i_parameters+1:i_brace_close]
+        else:
+            parameters = text[i_parameters:]
+        if not parameters.strip():
+            logger.error("Failed parsing function string (Missing parameters after where clause):\n" + text)
+            raise ValueError("Failed parsing function string (Missing parameters after where clause)")
+        d["templateparameters"] = split_parameters(parameters)
+        rest = text[i_rest:i_where]
+    else:
+        rest = text[i_rest:]
+
+    rest = rest.strip()
+    if rest.startswith("::"):
+        d["returntype"] = rest[2:].strip()
 
     return model.Function(**d)
 
@@ -142,21 +161,161 @@ brackets = {
     "[": "]",
     "{": "}"
 }
+closingbrackets = {v: k for k, v in brackets.items()}
 
 
-def find_closing_bracket(text, start, openbracket):
-    closebracket = brackets[openbracket]
-    counter = 0
-    for i in range(start, len(text)):
-        if text[i] == openbracket:
-            counter += 1
-        elif text[i] == closebracket:
-            counter -= 1
-        if counter == 0:
+def skip_string(text, start):
+    """
+    Return the index of the quote closing the string literal which
+    starts at text[start].
+    """
+    i = start + 1
+    while i < len(text):
+        x = text[i]
+        if x == "\\":
+            i += 1
+        elif x == '"':
             return i
+        i += 1
+    return len(text) - 1
+
+
+def match_brackets(text):
+    """
+    Map the index of every opening bracket in text to the index of its
+    closing bracket.
+
+    The text is scanned only once. Brackets inside string literals are
+    ignored and unbalanced brackets don't show up in the result.
+    """
+    pairs = {}
+    stack = []
+    i = 0
+    while i < len(text):
+        x = text[i]
+        if x == '"':
+            i = skip_string(text, i)
+        elif x in brackets:
+            stack.append(i)
+        elif x in closingbrackets:
+            if stack and text[stack[-1]] == closingbrackets[x]:
+                pairs[stack.pop()] = i
+        i += 1
+    return pairs
+
+
+def split_toplevel(text, separators=","):
+    """
+    Split text at every separator which isn't enclosed in brackets or in a
+    string literal.
+
+    Returns a list of (part, separator) tuples where separator is the
+    character that ended the part or None for the last part.
+    """
+    parts = []
+    depth = 0
+    i_start = 0
+    i = 0
+    while i < len(text):
+        x = text[i]
+        if x == '"':
+            i = skip_string(text, i)
+        elif x in brackets:
+            depth += 1
+        elif x in closingbrackets:
+            depth -= 1
+        elif depth == 0 and x in separators:
+            parts.append((text[i_start:i], x))
+            i_start = i + 1
+        i += 1
+    if depth != 0:
+        raise ValueError("Unbalanced brackets in:\n{}".format(repr(text)))
+    parts.append((text[i_start:], None))
+    return parts
+
+
+def split_parameters(text):
+    return [part.strip() for part, _ in split_toplevel(text)]
+
+
+def find_toplevel(text, substring, start=0):
+    """
+    Find the first occurrence of substring at or after start which isn't
+    enclosed in brackets or in a string literal.
+    """
+    depth = 0
+    i = 0
+    while i < len(text):
+        x = text[i]
+        if x == '"':
+            i = skip_string(text, i)
+        elif x in brackets:
+            depth += 1
+        elif x in closingbrackets:
+            depth -= 1
+        elif depth == 0 and i >= start and text.startswith(substring, i):
+            return i
+        i += 1
     return -1
 
 
+def format_argumentstring(argument):
+    name, argumenttype, value = argument
+    text = name
+    if argumenttype:
+        text += "::" + argumenttype
+    if value:
+        text += "=" + value
+    return text
+
+
+def format_signaturestring(normalized):
+    """
+    Inverse of parse_signaturestring for a signature given in the form
+    returned by model.Signature.normalized.
+    """
+    arguments, varargs, keywordarguments, kwvarargs = normalized
+    args = [format_argumentstring(x) for x in arguments]
+    if varargs is not None:
+        args.append(format_argumentstring(varargs) + "...")
+    kwargs = [format_argumentstring(x) for x in keywordarguments]
+    if kwvarargs is not None:
+        kwargs.append(format_argumentstring(kwvarargs) + "...")
+    if kwargs:
+        return ", ".join(args) + "; " + ", ".join(kwargs)
+    return ", ".join(args)
+
+
+def format_functionstring(qualifiedname, templateparameters, normalized):
+    """
+    Inverse of parse_functionstring.
+    """
+    text = "{}({})".format(qualifiedname, format_signaturestring(normalized))
+    if templateparameters:
+        text += " where {%s}" % ", ".join(templateparameters)
+    return text
+
+
+parsers = {
+    "module": parse_modulestring,
+    "abstract": parse_abstractstring,
+    "type": parse_typestring,
+    "function": parse_functionstring,
+    "signature": parse_signaturestring,
+    "argument": parse_argumentstring,
+}
+
+
+@lru_cache(maxsize=4096)
+def _parse(objtype, text):
+    return parsers[objtype](text)
+
+
 def parse(objtype, text):
-    f = eval("parse_%sstring" % objtype)
-    return f(text)
+    """
+    Parse text into the model object of the given type.
+
+    Results are cached, every call returns a private copy of the cached
+    node which the caller is free to modify or insert into a document.
+    """
+    return _parse(objtype, text).deepcopy()
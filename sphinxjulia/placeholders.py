@@ -0,0 +1,45 @@
+"""
+Bookkeeping for directives rendered from the domain data.
+
+Directives like ``jl:typetree`` and ``jl:methods`` show objects documented
+anywhere in the project. They leave a placeholder node which is replaced
+after all documents are read and remember their documents, which are
+written again whenever the part of the domain data they show changed.
+"""
+from . import model
+
+
+class Dependents:
+
+    def __init__(self, registry, dicnames):
+        # Domain data dictionary: target -> [model.ObjectEntry, ...]
+        self.registry = registry
+        # Domain data dictionaries the rendered placeholders depend on
+        self.dicnames = dicnames
+        self.before = None
+
+    def register(self, env, target, scope):
+        entry = model.ObjectEntry(env.docname, scope, target)
+        env.domaindata['jl'][self.registry].setdefault(target, []).append(entry)
+
+    def key(self, dictionaries):
+        entries = set()
+        for dicname in self.dicnames:
+            for values in dictionaries[dicname].values():
+                entries.update(values)
+        return frozenset(entries)
+
+    def before_read(self, app, env, added, changed, removed):
+        # Sphinx < 2.0 passes the builder instead of the environment
+        self.before = self.key(app.env.domaindata['jl'])
+        return []
+
+    def after_read(self, app, env):
+        dictionaries = env.domaindata['jl']
+        if self.before is None or self.before == self.key(dictionaries):
+            return []
+        self.before = None
+        docnames = set()
+        for entries in dictionaries[self.registry].values():
+            docnames.update(entry.docname for entry in entries)
+        return sorted(docnames)
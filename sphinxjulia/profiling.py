@@ -0,0 +1,137 @@
+"""
+Optional cProfile profiles of single documents.
+
+The autodoc directives, the julia directives and the resolution of cross
+references are profiled for the documents matching the patterns given in
+``julia_profile``. The profile of a document is dumped when it has been
+read and when its references have been resolved (possibly in different
+processes of a parallel build), at the end of the build both parts are
+merged into ``julia-profile/<docname>.pstats`` in the output directory.
+"""
+import cProfile
+import functools
+import os
+import pstats
+import shutil
+from contextlib import contextmanager
+from fnmatch import fnmatch
+
+
+class Profiler:
+
+    def __init__(self):
+        # Nothing is profiled as long as patterns is empty
+        self.patterns = ()
+        self.directory = None
+        self.selected = {}
+        self.profiles = {}
+        self.active = set()
+
+    def start(self, directory, patterns):
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        self.directory = directory
+        self.patterns = tuple(patterns)
+        self.selected = {}
+        self.profiles = {}
+        self.active = set()
+
+    def wanted(self, docname):
+        try:
+            return self.selected[docname]
+        except KeyError:
+            pass
+        result = any(fnmatch(docname, x) for x in self.patterns)
+        self.selected[docname] = result
+        return result
+
+    @contextmanager
+    def profile(self, docname):
+        # Nested calls (e.g. julia directives in docstrings) are already
+        # covered by the outer profile.
+        if docname in self.active or not self.wanted(docname):
+            yield
+            return
+        profile = self.profiles.get(docname)
+        if profile is None:
+            profile = self.profiles[docname] = cProfile.Profile()
+        self.active.add(docname)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.active.discard(docname)
+
+    def dump(self, docname, phase):
+        profile = self.profiles.pop(docname, None)
+        if profile is None:
+            return
+        path = os.path.join(self.directory, docname + "." + phase)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        profile.dump_stats(path)
+
+    def finish(self, outdir):
+        """
+        Merge the dumped parts into one profile per document.
+        """
+        if self.directory is None:
+            return
+        parts = {}
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                docname = os.path.relpath(path, self.directory)
+                docname = docname.rsplit(".", 1)[0].replace(os.sep, "/")
+                parts.setdefault(docname, []).append(path)
+        for docname, paths in sorted(parts.items()):
+            path = os.path.join(outdir, docname + ".pstats")
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            pstats.Stats(*sorted(paths)).dump_stats(path)
+        shutil.rmtree(self.directory)
+        self.__init__()
+
+
+profiler = Profiler()
+
+
+def profiled(docname):
+    """
+    Decorator profiling calls of the function if they belong to a selected
+    document, docname(*args) returns the document of a call.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not profiler.patterns:
+                return f(*args, **kwargs)
+            with profiler.profile(docname(*args)):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start(app):
+    patterns = app.config.julia_profile
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if patterns:
+        profiler.start(os.path.join(app.outdir, ".julia-profile"), patterns)
+
+
+def doctree_read(app, doctree):
+    if profiler.patterns:
+        profiler.dump(app.env.docname, "read")
+
+
+def doctree_resolved(app, doctree, docname):
+    if profiler.patterns:
+        profiler.dump(docname, "resolve")
+
+
+def finish(app, exception):
+    if profiler.directory is not None:
+        profiler.finish(os.path.join(app.outdir, "julia-profile"))
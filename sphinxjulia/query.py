@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import docutils.utils
 
 from . import model, parsing_sphinxstring
@@ -10,102 +12,162 @@ def resolvescope(basescope, targetstring):
             break
         N += 1
     name = targetstring[N:]
-    scope = basescope[:len(basescope)-N+1]
+    scope = tuple(basescope[:len(basescope)-N+1])
     if "." in name:
         innerscope, name = name.rsplit(".", 1)
-        scope += innerscope.split(".")
+        scope += tuple(innerscope.split("."))
     return scope, name
 
 
-def match_argument(pattern, argument):
-    if pattern.name and pattern.name != argument.name:
-        return False
-    if pattern.argumenttype and pattern.argumenttype != argument.argumenttype:
-        return False
-    if pattern.value and pattern.value != argument.value:
-        return False
+def compile_argument(pattern):
+    """
+    Translate an argument pattern into a tuple of (index, value) checks on
+    normalized arguments. Empty fields of the pattern match anything.
+    """
+    if pattern is None:
+        return None
+    checks = []
+    for i, value in enumerate((pattern.name, pattern.argumenttype,
+                               pattern.value)):
+        if value:
+            checks.append((i, value))
+    return tuple(checks)
+
+
+def check_argument(checks, argument):
+    for i, value in checks:
+        if argument[i] != value:
+            return False
     return True
 
 
-def match_signature(pattern, signature):
-    parguments = pattern.positionalarguments + pattern.optionalarguments
-    if len(parguments) == len(pattern.keywordarguments) == 0 and\
-       pattern.varargs is None and pattern.kwvarargs is None:
+class SignatureMatcher:
+    """
+    Signature pattern compiled for matching against normalized signatures.
+    """
+
+    def __init__(self, pattern):
+        arguments, varargs, keywordarguments, kwvarargs = pattern.normalized()
+        self.anything = not arguments and not keywordarguments\
+            and varargs is None and kwvarargs is None
+        self.arity = len(arguments)
+        checks = [compile_argument(x) for x in
+                  pattern.positionalarguments + pattern.optionalarguments]
+        # Only positions which actually restrict the argument are checked
+        self.arguments = tuple((i, x) for i, x in enumerate(checks) if x)
+        self.varargs = compile_argument(pattern.varargs)
+        self.keywordarguments = tuple((x.name, compile_argument(x))
+                                      for x in pattern.keywordarguments)
+        self.kwvarargs = compile_argument(pattern.kwvarargs)
+
+    def match(self, normalized):
+        if self.anything:
+            return True
+        arguments, varargs, keywordarguments, kwvarargs = normalized
+        if len(arguments) != self.arity:
+            return False
+        for i, checks in self.arguments:
+            if not check_argument(checks, arguments[i]):
+                return False
+        if self.varargs and varargs is not None\
+                and not check_argument(self.varargs, varargs):
+            return False
+        for name, checks in self.keywordarguments:
+            for argument in keywordarguments:
+                if argument[0] == name:
+                    if not check_argument(checks, argument):
+                        return False
+                    break
+            else:
+                return False
+        if self.kwvarargs and kwvarargs is not None\
+                and not check_argument(self.kwvarargs, kwvarargs):
+            return False
         return True
-    
-    farguments = signature.positionalarguments + signature.optionalarguments
-    if len(parguments) != len(farguments):
-        return False
-    for i in range(len(parguments)):
-        if not match_argument(parguments[i], farguments[i]):
+
+
+class NameMatcher:
+    """
+    Matches objects of the same type as the pattern by name.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.modeltype = type(pattern)
+        self.name = pattern.name
+
+    def match(self, obj):
+        return type(obj) is self.modeltype and obj.name == self.name
+
+
+class FunctionMatcher(NameMatcher):
+    """
+    Matches functions by name, template parameters and signature.
+    """
+
+    def __init__(self, pattern):
+        NameMatcher.__init__(self, pattern)
+        self.templateparameters = frozenset(pattern.templateparameters)
+        self.signature = SignatureMatcher(pattern.signature)
+
+    def match(self, obj):
+        if type(obj) is not self.modeltype or obj.name != self.name:
             return False
-    if pattern.varargs and signature.varargs and \
-            not match_argument(pattern.varargs, signature.varargs):
-        return False
-    
-    pkwd = {arg.name: arg for arg in pattern.keywordarguments}
-    fkwd = {arg.name: arg for arg in signature.keywordarguments}
-    for name in pkwd:
-        if name not in fkwd or not match_argument(fkwd[name], pkwd[name]):
+        if self.templateparameters and\
+                self.templateparameters != set(obj.templateparameters):
             return False
-    if pattern.kwvarargs and signature.kwvarargs and \
-            not match_argument(pattern.kwvarargs, signature.kwvarargs):
-        return False
-    
-    return True
+        return self.signature.match(obj.signature.normalized())
+
+    def match_entry(self, entry):
+        """
+        Match a function registered in the domain data.
+        """
+        if self.templateparameters and\
+                self.templateparameters != set(entry.templateparameters):
+            return False
+        return self.signature.match(entry.signature)
 
 
-def match_function(pattern, function):
-    if pattern.name != function.name:
-        return False
-    tpars = set(pattern.templateparameters)
-    if tpars and tpars != set(function.templateparameters):
-        return False
-    return match_signature(pattern.signature, function.signature)
+matchers = {
+    model.Function: FunctionMatcher,
+    model.Module: NameMatcher,
+    model.Type: NameMatcher,
+    model.Abstract: NameMatcher,
+}
 
 
-def match_module(pattern, module):
-    if pattern.name != module.name:
-        return False
-    return True
+def compile(pattern):
+    return matchers[type(pattern)](pattern)
 
 
-def match_type(pattern, type):
-    if pattern.name != type.name:
-        return False
-    return True
+@lru_cache(maxsize=4096)
+def compile_string(objtype, text):
+    return compile(parsing_sphinxstring.parse(objtype, text))
 
 
-def match_abstract(pattern, abstract):
-    if pattern.name != abstract.name:
-        return False
-    return True
+def match_signature(pattern, signature):
+    return SignatureMatcher(pattern).match(signature.normalized())
 
 
 def match(pattern, obj):
-    if type(pattern) != type(obj):
-        return False
-    f = eval("match_"+type(obj).__name__.lower())
-    return f(pattern, obj)
+    return compile(pattern).match(obj)
 
 
-def find_function_in_scope(scope, name, funcpattern, dictionary):
+def find_function_in_scope(scope, name, funcmatcher, dictionary):
     if name not in dictionary:
         return []
-    tpars = set(funcpattern.templateparameters)
     matches = []
     for func in dictionary[name]:
-        if scope is not None and scope != func["scope"]:
-            continue
-        if tpars and tpars != set(func.templateparameters):
+        if scope is not None and scope != func.scope:
             continue
-        if match_signature(funcpattern.signature, func["signature"]):
+        if funcmatcher.match_entry(func):
             matches.append(func)
     return matches
 
 
 def find_function_by_string(basescope, targetstring, dictionary):
-    funcpattern = parsing_sphinxstring.parse_functionstring(targetstring)
+    funcmatcher = compile_string("function", targetstring)
+    funcpattern = funcmatcher.pattern
     if funcpattern.modulename:
         targetstring = ".".join([funcpattern.modulename, funcpattern.name])
     else:
@@ -114,21 +176,21 @@ def find_function_by_string(basescope, targetstring, dictionary):
             targetstring = "." + funcpattern.name
         else:
             targetstring = funcpattern.name
-    specified_scope, name = resolvescope([], targetstring)
+    specified_scope, name = resolvescope((), targetstring)
     # For absolute references look at global namespace first
     if not targetstring.startswith("."):
         matches = find_function_in_scope(specified_scope, name,
-                                         funcpattern, dictionary)
+                                         funcmatcher, dictionary)
         if matches:
             return matches
     # Relative references
     scope, name = resolvescope(basescope, targetstring)
-    matches = find_function_in_scope(scope, name, funcpattern, dictionary)
+    matches = find_function_in_scope(scope, name, funcmatcher, dictionary)
     if matches:
         return matches
     # If it's a single name without scope specification look everywhere
     if not targetstring.startswith(".") and len(specified_scope) == 0:
-        matches = find_function_in_scope(None, name, funcpattern, dictionary)
+        matches = find_function_in_scope(None, name, funcmatcher, dictionary)
     return matches
 
 
@@ -137,7 +199,7 @@ def find_object_in_scope(scope, name, dictionary):
         return []
     matches = []
     for obj in dictionary[name]:
-        if scope is None or scope == obj["scope"]:
+        if scope is None or scope == obj.scope:
             matches.append(obj)
     return matches
 
@@ -146,7 +208,7 @@ def find_object_by_string(objtype, basescope, targetstring, dictionaries):
     dictionary = dictionaries[objtype]
     if objtype == "function":
         return find_function_by_string(basescope, targetstring, dictionary)
-    specified_scope, name = resolvescope([], targetstring)
+    specified_scope, name = resolvescope((), targetstring)
     # For absolute references look at global namespace first
     if not targetstring.startswith("."):
         matches = find_object_in_scope(specified_scope, name, dictionary)
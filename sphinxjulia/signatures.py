@@ -0,0 +1,93 @@
+"""
+Parsing the signatures of hand-written directives with julia.
+
+The signatures given to ``jl:function``, ``jl:type`` and ``jl:abstract``
+are normally parsed by the heuristic parser in parsing_sphinxstring. With
+``julia_parse_signatures`` enabled, the sources of all documents about to
+be read are scanned for these directives before reading starts and their
+signatures are parsed by julia's own parser in one batch. The directives
+then take their model from the parser's cache.
+"""
+import io
+import re
+
+from sphinx.util import logging
+
+from . import parsing_juliacode
+
+logger = logging.getLogger(__name__)
+
+objtypes = ("function", "type", "abstract")
+
+_directive = re.compile(r"^(?P<indent>\s*)\.\.\s+(?P<prefix>jl:)?"
+                        r"(?P<objtype>function|type|abstract)::"
+                        r"\s*(?P<arguments>.*)$")
+
+
+def normalize(text):
+    """
+    Signature given on several lines as a single line.
+    """
+    return " ".join(x.strip() for x in text.splitlines()).strip()
+
+
+def scan(text, unprefixed=False):
+    """
+    Find julia object directives in reST source.
+
+    Returns tuples (objtype, signature). Directives without the "jl:"
+    prefix are only considered if unprefixed is True.
+    """
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        m = _directive.match(lines[i])
+        i += 1
+        if m is None or not (m.group("prefix") or unprefixed):
+            continue
+        indent = len(m.group("indent"))
+        arguments = [m.group("arguments")]
+        while i < len(lines):
+            line = lines[i]
+            stripped = line.strip()
+            if not stripped or stripped.startswith(":")\
+                    or len(line) - len(line.lstrip()) <= indent:
+                break
+            arguments.append(stripped)
+            i += 1
+        signature = normalize("\n".join(arguments))
+        if signature:
+            yield m.group("objtype"), signature
+
+
+def parser(env):
+    parser = getattr(env, "juliaparser", None)
+    if parser is None:
+        # Only the domain is used, juliaautodoc creates it otherwise
+        parser = env.juliaparser = parsing_juliacode.JuliaParser()
+    return parser
+
+
+def prepare(app, env, docnames):
+    if not app.config.julia_parse_signatures:
+        return
+    unprefixed = app.config.primary_domain == "jl"
+    items = set()
+    for docname in docnames:
+        with io.open(env.doc2path(docname), encoding="utf-8") as f:
+            items.update(scan(f.read(), unprefixed))
+    try:
+        parser(env).parsestrings(items)
+    except (OSError, parsing_juliacode.ParseError) as e:
+        logger.warning("Parsing signatures with julia failed, falling back "
+                       "to the builtin parser: {}".format(e))
+
+
+def lookup(env, objtype, text):
+    """
+    Model julia returned for the signature or None.
+    """
+    parser = getattr(env, "juliaparser", None)
+    if parser is None:
+        return None
+    return parser.parsedstring(objtype, normalize(text))
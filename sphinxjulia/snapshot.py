@@ -0,0 +1,160 @@
+"""
+Snapshots of parsed julia files.
+
+A snapshot stores the model text returned by the julia parser for every
+file of a source tree, keyed by the hash of the file content. Builds using
+a snapshot only need julia for files which changed after it was written.
+
+Snapshots are created with the ``sphinxjulia-parse`` command::
+
+    sphinxjulia-parse -o julia-snapshot.json.gz path/to/Package
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from . import sourcetree
+from .parsing_juliacode import JuliaParser, ParseError
+
+# Version of the file format
+version = 1
+
+
+def parserversion():
+    """
+    Hash of the julia sources of the parser, snapshots written by a
+    different parser are not used.
+    """
+    directory = os.path.dirname(os.path.realpath(__file__))
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(directory, "parsetools",
+                                              "src", "*.jl"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Snapshot:
+
+    def __init__(self, texts=None):
+        # content hash -> model text
+        self.texts = texts if texts is not None else {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def get(self, digest):
+        text = self.texts.get(digest)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def stats(self):
+        return {"entries": len(self.texts), "hits": self.hits,
+                "misses": self.misses}
+
+
+def load(path):
+    """
+    Read a snapshot. Returns None if it was written by another version,
+    raises OSError or ValueError if the file can't be read.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != version\
+            or data.get("parser") != parserversion():
+        return None
+    return Snapshot(data["files"])
+
+
+def write(path, snapshot):
+    data = {"version": version, "parser": parserversion(),
+            "files": snapshot.texts}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"), sort_keys=True)
+
+
+def create(parser, sourcepaths, jobs=None, previous=None):
+    """
+    Parse all given files (those already contained in the previous snapshot
+    are taken from there). Returns the snapshot, the number of files that
+    had to be parsed and the files which failed to parse.
+    """
+    digests = {}
+    for sourcepath in sourcepaths:
+        digests.setdefault(parser.contenthash(sourcepath), sourcepath)
+    texts = {}
+    pending = []
+    for digest, sourcepath in digests.items():
+        text = previous.get(digest) if previous is not None else None
+        if text is None:
+            pending.append(digest)
+        else:
+            texts[digest] = text
+
+    def read(digest):
+        try:
+            return parser.readtext(digests[digest])
+        except ParseError:
+            return None
+
+    # PyJulia embeds a single julia runtime which can't be used from
+    # several threads at the same time.
+    if parser.julia:
+        jobs = 1
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(read, pending))
+    failed = []
+    for digest, text in zip(pending, results):
+        if text is None:
+            failed.append(digests[digest])
+        else:
+            texts[digest] = text
+    return Snapshot(texts), len(pending), failed
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog="sphinxjulia-parse",
+        description="Parse julia files into a snapshot usable by the "
+                    "juliaautodoc_snapshot config value.")
+    argparser.add_argument("paths", nargs="+",
+                           help="package roots, directories or glob patterns")
+    argparser.add_argument("-o", "--output", required=True,
+                           help="snapshot file to write")
+    argparser.add_argument("-j", "--jobs", type=int, default=None,
+                           help="number of files parsed concurrently")
+    argparser.add_argument("--update", action="store_true",
+                           help="only parse files not in the existing "
+                                "snapshot")
+    args = argparser.parse_args(argv)
+
+    sourcepaths = []
+    for path in args.paths:
+        sourcepaths.extend(sourcetree.discover(path))
+    if not sourcepaths:
+        argparser.error("no julia files found")
+    previous = None
+    if args.update and os.path.exists(args.output):
+        previous = load(args.output)
+    parser = JuliaParser()
+    snapshot, parsed, failed = create(parser, sorted(set(sourcepaths)),
+                                      args.jobs, previous)
+    write(args.output, snapshot)
+    print("{}: {} files, {} parsed".format(args.output, len(snapshot), parsed))
+    for sourcepath in failed:
+        print("failed to parse " + sourcepath, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
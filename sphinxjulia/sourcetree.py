@@ -0,0 +1,107 @@
+"""
+Assemble the models of several julia files into one module structure.
+
+Files are combined the same way julia does it: the content of a file
+included by ``include("...")`` is spliced into the module containing the
+include statement at the position of the statement.
+"""
+import glob
+import os
+
+from . import model
+
+
+def discover(path):
+    """
+    Find all julia files belonging to path.
+
+    path is either a package root (in which case its ``src`` directory is
+    used), a directory or a glob pattern like ``src/**/*.jl``.
+    """
+    if os.path.isdir(path):
+        srcdir = os.path.join(path, "src")
+        if os.path.isdir(srcdir):
+            path = srcdir
+        path = os.path.join(path, "**", "*.jl")
+    sourcepaths = [os.path.realpath(p) for p in glob.glob(path, recursive=True)
+                   if os.path.isfile(p)]
+    return sorted(sourcepaths)
+
+
+def includepath(sourcepath, include):
+    directory = os.path.dirname(sourcepath)
+    return os.path.realpath(os.path.join(directory, include.path))
+
+
+def find_includes(modulenode, sourcepath):
+    paths = [includepath(sourcepath, x) for x in modulenode.includes]
+    for node in modulenode.children:
+        if isinstance(node, model.Module):
+            paths.extend(find_includes(node, sourcepath))
+    return paths
+
+
+def parse(parser, sourcepaths, jobs=None):
+    """
+    Parse all given files and every file reachable from them by includes.
+
+    Files are parsed in waves: all currently known files are handed to the
+    parser at once, then the includes found in them form the next wave.
+    """
+    models = {}
+    pending = list(sourcepaths)
+    while pending:
+        models.update(parser.parsefiles(pending, jobs))
+        pending = []
+        for sourcepath in list(models):
+            for path in find_includes(models[sourcepath], sourcepath):
+                if path not in models and path not in pending\
+                        and os.path.isfile(path):
+                    pending.append(path)
+    return models
+
+
+def assemble(sourcepaths, models):
+    """
+    Combine the models of the given files into a single anonymous module.
+
+    Files which are included by another file only show up at the place
+    where they are included.
+    """
+    included = set()
+    for sourcepath, modulenode in models.items():
+        included.update(find_includes(modulenode, sourcepath))
+    body = []
+    for sourcepath in sourcepaths:
+        if sourcepath not in included:
+            body.extend(splice(models[sourcepath], sourcepath, models,
+                               [sourcepath]))
+    return model.Module(name="", body=body)
+
+
+def splice(modulenode, sourcepath, models, stack):
+    includes = sorted(modulenode.includes, key=lambda x: x.position)
+    body = []
+    for position, node in enumerate(modulenode.body):
+        while includes and includes[0].position <= position:
+            body.extend(expand(includes.pop(0), sourcepath, models, stack))
+        body.append(copy(node, sourcepath, models, stack))
+    for include in includes:
+        body.extend(expand(include, sourcepath, models, stack))
+    return body
+
+
+def expand(include, sourcepath, models, stack):
+    path = includepath(sourcepath, include)
+    # Ignore files that couldn't be found and recursive includes
+    if path not in models or path in stack:
+        return []
+    return splice(models[path], path, models, stack + [path])
+
+
+def copy(node, sourcepath, models, stack):
+    if isinstance(node, model.Module):
+        body = splice(node, sourcepath, models, stack)
+        return model.Module(name=node.name, docstring=node.docstring,
+                            body=body)
+    return node.deepcopy()
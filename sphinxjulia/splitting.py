@@ -0,0 +1,117 @@
+"""
+Split the output of autodoc directives into one page per documented symbol.
+
+Before reading, the sources are scanned for autodoc directives which
+should be split. For every symbol they document a small page containing
+an autodoc directive for just this symbol is written into a separate
+directory. The directive itself then only renders a summary table linking
+to these pages.
+"""
+import io
+import os
+import re
+
+marker = ".. This page was generated by sphinxjulia, do not edit."
+
+_directive = re.compile(r"^(?P<indent>\s*)\.\.\s+(?P<name>jl:auto\w+)::"
+                        r"\s*(?P<arguments>.*)$")
+_option = re.compile(r"^:(?P<name>[\w-]+):\s*(?P<value>.*)$")
+_unsafe = re.compile(r"[^\w!-]")
+
+
+def scan(text):
+    """
+    Find autodoc directives in reST source.
+
+    Returns tuples (directivename, argumentstring, options).
+    """
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        m = _directive.match(lines[i])
+        i += 1
+        if m is None:
+            continue
+        indent = len(m.group("indent"))
+        arguments = [m.group("arguments")]
+        options = {}
+        while i < len(lines):
+            line = lines[i]
+            stripped = line.strip()
+            if not stripped or len(line) - len(line.lstrip()) <= indent:
+                break
+            option = _option.match(stripped)
+            if option is not None:
+                options[option.group("name")] = option.group("value")
+            elif not options:
+                # Continuation of the arguments
+                arguments.append(stripped)
+            i += 1
+        yield m.group("name"), " ".join(arguments).strip(), options
+
+
+def pagename(directory, scope, name):
+    """
+    Docname of the page documenting the symbol name in the given scope.
+    """
+    parts = [_unsafe.sub(lambda m: "-%x" % ord(m.group()), x)
+             for x in list(scope) + [name]]
+    return directory + "/" + ".".join(parts)
+
+
+def title(scope, name):
+    text = ".".join(list(scope) + [name])
+    return re.sub(r"([^\w.])", r"\\\1", text)
+
+
+def stub(directivename, argument, scope, node, split):
+    lines = [".. {}:: {}".format(directivename, argument)]
+    if scope:
+        lines.append("   :module: " + ".".join(scope))
+    lines.append("   :member: " + node.name)
+    lines.append("   :split:" if split else "   :nosplit:")
+    return "\n".join(lines)
+
+
+def pagetext(heading, blocks):
+    lines = [marker, "", heading, "=" * len(heading), ""]
+    for block in blocks:
+        lines.extend([block, ""])
+    return "\n".join(lines)
+
+
+def summaryline(nodes):
+    """
+    First line of the first docstring of the given objects.
+    """
+    for node in nodes:
+        for line in node.docstring.split("\n"):
+            if line.strip():
+                return line.strip()
+    return ""
+
+
+def write(directory, pages, suffix):
+    """
+    Write the given pages {path: text} into directory and remove pages
+    generated previously which are not needed anymore. Files are only
+    touched if their content changes.
+    """
+    pages = {os.fspath(path): text for path, text in pages.items()}
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for path, text in pages.items():
+        if os.path.exists(path):
+            with io.open(path, encoding="utf-8") as f:
+                if f.read() == text:
+                    continue
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if path in pages or not filename.endswith(suffix):
+            continue
+        with io.open(path, encoding="utf-8") as f:
+            generated = f.readline().rstrip("\n") == marker
+        if generated:
+            os.remove(path)
@@ -0,0 +1,99 @@
+"""
+"Did you mean" suggestions for unresolved cross-references.
+
+The qualified names (and for functions the signatures) of all documented
+objects are put into a trigram index once per build. Looking up a broken
+target only scores the names sharing the most trigrams with it, which
+keeps suggestions cheap even for projects with many thousand objects.
+"""
+import difflib
+from collections import Counter
+
+from . import parsing_sphinxstring
+
+
+def trigrams(text):
+    text = "  " + text.lower() + " "
+    return set(text[i:i+3] for i in range(len(text) - 2))
+
+
+class Index:
+    # Number of candidates (by shared trigrams) compared with difflib
+    candidates = 20
+    # Trigrams of more names than this are ignored in lookups
+    common = 200
+
+    def __init__(self, entries):
+        # entries: (text matched against, text suggested)
+        self.keys = []
+        self.suggestions = {}
+        for key, suggestion in entries:
+            suggestions = self.suggestions.get(key)
+            if suggestions is None:
+                suggestions = self.suggestions[key] = []
+                self.keys.append(key)
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        self.postings = {}
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, []).append(i)
+
+    def suggest(self, text, count=3, cutoff=0.6):
+        # Trigrams shared by a large part of all names (e.g. of a common
+        # module prefix) say little and are skipped, which keeps the
+        # lookup sublinear in the number of names.
+        postings = sorted((self.postings[gram] for gram in trigrams(text)
+                           if gram in self.postings), key=len)
+        limit = max(self.common, len(self.keys) // 100)
+        postings = [x for i, x in enumerate(postings)
+                    if i < 3 or len(x) <= limit]
+        counts = Counter()
+        for posting in postings:
+            counts.update(posting)
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(text.lower())
+        scored = []
+        for i, shared in counts.most_common(self.candidates):
+            key = self.keys[i]
+            matcher.set_seq1(key.lower())
+            if matcher.real_quick_ratio() < cutoff\
+                    or matcher.quick_ratio() < cutoff:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((-ratio, key))
+        result = []
+        for ratio, key in sorted(scored):
+            for suggestion in self.suggestions[key]:
+                if suggestion not in result:
+                    result.append(suggestion)
+        return result[:count]
+
+
+def entries(objtype, dictionary):
+    for name, values in dictionary.items():
+        for entry in values:
+            qualifiedname = ".".join(entry.scope + (name,))
+            yield name, qualifiedname
+            yield qualifiedname, qualifiedname
+            if objtype == "function":
+                signature = parsing_sphinxstring.format_functionstring(
+                    qualifiedname, entry.templateparameters, entry.signature)
+                yield signature, signature
+
+
+# objtype -> Index, built on the first unresolved reference of a build
+indexes = {}
+
+
+def suggest(env, objtype, target):
+    index = indexes.get(objtype)
+    if index is None:
+        dictionary = env.domaindata['jl'][objtype]
+        index = indexes[objtype] = Index(entries(objtype, dictionary))
+    return index.suggest(target.lstrip(".~"))
+
+
+def clear(app, env):
+    indexes.clear()
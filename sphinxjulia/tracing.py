@@ -0,0 +1,126 @@
+"""
+Optional recording of what the extension spends its time on.
+
+Spans are written in the Chrome trace event format and can be inspected
+with chrome://tracing or Perfetto. Every process writes its events line
+by line into its own file so that nothing is lost when processes forked
+by a parallel build exit. At the end of the build all files are merged
+into a single trace.
+"""
+import functools
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+
+    def __init__(self):
+        self.directory = None
+        self.file = None
+        self.pid = None
+        # Events are written by the threads parsing files as well
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def start(self, directory):
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        self.directory = directory
+        self.file = None
+        self.pid = None
+
+    def write(self, event):
+        pid = os.getpid()
+        line = json.dumps(event) + "\n"
+        with self.lock:
+            if self.pid != pid:
+                # First event of this process (possibly forked from the main
+                # process), line buffering makes sure every event hits the
+                # disk.
+                self.pid = pid
+                path = os.path.join(self.directory, "{}.jsonl".format(pid))
+                self.file = open(path, "a", buffering=1)
+                self.file.write(json.dumps({
+                    "name": "process_name", "ph": "M", "pid": pid,
+                    "args": {"name": "sphinx-build ({})".format(pid)}}) + "\n")
+            self.file.write(line)
+
+    def record(self, name, category, start, end, args):
+        self.write({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.current_thread().ident,
+            "args": args,
+        })
+
+    @contextmanager
+    def span(self, name, category="sphinxjulia", **args):
+        if self.directory is None:
+            yield
+            return
+        # Wall clock time keeps the events of different processes aligned
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.time(), args)
+
+    def finish(self, path):
+        """
+        Merge the events of all processes into a single trace file.
+        """
+        if self.directory is None:
+            return
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+        events = []
+        for filename in sorted(os.listdir(self.directory)):
+            with open(os.path.join(self.directory, filename)) as f:
+                events.extend(json.loads(line) for line in f if line.strip())
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+        shutil.rmtree(self.directory)
+        self.directory = None
+        self.file = None
+        self.pid = None
+
+
+tracer = Tracer()
+
+
+def traced(name, category="sphinxjulia"):
+    """
+    Decorator recording every call of the function as span.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if tracer.directory is None:
+                return f(*args, **kwargs)
+            with tracer.span(name, category):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start(app):
+    if app.config.julia_trace:
+        tracer.start(os.path.join(app.outdir, ".julia-trace"))
+
+
+def finish(app, exception):
+    if tracer.enabled:
+        tracer.finish(os.path.join(app.outdir, "julia-trace.json"))
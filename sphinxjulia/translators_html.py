@@ -1,24 +1,28 @@
+import posixpath
 
+from . import caching, typelinks
+from .tracing import traced
 
-def format_signature(signature):
+
+def format_signature(signature, link):
     arguments = signature.positionalarguments + signature.optionalarguments
-    args = [format_argument(arg) for arg in arguments]
+    args = [format_argument(arg, link) for arg in arguments]
     if signature.varargs is not None:
-        args.append(format_argument(signature.varargs) + "...")
+        args.append(format_argument(signature.varargs, link) + "...")
     if not (signature.keywordarguments or signature.kwvarargs):
         return ", ".join(args)
-    kwargs = [format_argument(arg) for arg in signature.keywordarguments]
+    kwargs = [format_argument(arg, link) for arg in signature.keywordarguments]
     if signature.kwvarargs is not None:
-        kwargs.append(format_argument(signature.kwvarargs) + "...")
+        kwargs.append(format_argument(signature.kwvarargs, link) + "...")
     return ", ".join(args) + "; " + ", ".join(kwargs)
 
 
-def format_argument(argument):
+def format_argument(argument, link):
     out = "<em>" + argument.name + "</em>"
     if argument.macrocall:
         out = "<small>" + argument.macrocall + "</small> " + out
     if argument.argumenttype:
-        out += "::" + argument.argumenttype
+        out += "::" + link(argument.argumenttype)
     if argument.value:
         out += " = <tt>" + argument.value + "</tt>"
     return out
@@ -31,62 +35,110 @@ def format_templateparameters(args):
         return ""
 
 
-def format_parenttype(args):
+def format_parenttype(args, link):
     if args:
-        return "<: " + args
+        return "<: " + link(args)
     else:
         return ""
 
 
-def visit_generic(translator, node, descriptor, signature):
-    I = translator.body.append
-    I('<dl class="class">')
-    I('<dt id=%s>' % node["ids"][0])
-    I('<em class="property">%s </em>' % descriptor)
-    I('<code class="descname">')
-    I(signature)
-    I('</code>')
+def typelinker(translator, node):
+    """
+    Function turning the type strings of node into HTML linking to the
+    documented types and the part of the render cache key it depends on.
+    """
+    builder = translator.builder
+    env = builder.env
+    docname = getattr(builder, "current_docname", None)
+    if docname is None:
+        directory = ""
+    else:
+        directory = posixpath.dirname(builder.get_target_uri(docname))
+    scope = typelinks.nodescope(node)
+    exclude = typelinks.parameternames(getattr(node, "templateparameters", ()))
+
+    def makelink(target, name):
+        docname, anchor, uri = target
+        if docname is None:
+            classes = "reference external"
+        else:
+            classes = "reference internal"
+            uri = builder.get_target_uri(docname)
+        return '<a class="%s" href="%s#%s" title="%s">%s</a>' % (
+            classes, typelinks.relative_uri(directory, uri), anchor, anchor,
+            name)
+
+    def link(typestring):
+        return typelinks.link(env, typestring, scope, exclude, makelink)
+    # The builder name is part of the key: html and singlehtml use
+    # different target URIs for the same docname and directory.
+    return link, (builder.name, directory, scope)
+
+
+def visit_generic(translator, node, descriptor, signature, key=()):
+    header = caching.rendered.get_or_create(
+        ("html",) + key + node.key(),
+        lambda: ('<em class="property">%s </em>' % descriptor
+                 + '<code class="descname">' + signature() + '</code>'))
+    translator.body.append('<dl class="class"><dt id=%s>' % node["ids"][0]
+                           + header)
     translator.add_permalink_ref(node, "Permalink to this" + descriptor)
-    I('</dt><dd class="body">')
+    translator.body.append('</dt><dd class="body">')
 
 
 def depart_generic(translator, node):
     translator.body.append("</dd></dl>")
 
 
+@traced("visit_module", "translator")
 def visit_module(translator, node):
-    visit_generic(translator, node, "module", node.name)
+    visit_generic(translator, node, "module", lambda: node.name)
 
 
+@traced("visit_type", "translator")
 def visit_type(translator, node):
-    tpars = format_templateparameters(node.templateparameters)
-    partype = format_parenttype(node.parenttype)
-    visit_generic(translator, node, "type", node.name + tpars + partype)
+    link, key = typelinker(translator, node)
+    visit_generic(translator, node, "type",
+                  lambda: format_typeheader(node, link), key)
 
 
+@traced("visit_abstract", "translator")
 def visit_abstract(translator, node):
+    link, key = typelinker(translator, node)
+    visit_generic(translator, node, "abstract",
+                  lambda: format_typeheader(node, link), key)
+
+
+def format_typeheader(node, link):
     tpars = format_templateparameters(node.templateparameters)
-    partype = format_parenttype(node.parenttype)
-    visit_generic(translator, node, "abstract", node.name + tpars + partype)
+    partype = format_parenttype(node.parenttype, link)
+    return node.name + tpars + partype
 
 
-def visit_function(translator, node):
+def format_functionheader(node, link):
     tpars = format_templateparameters(node.templateparameters)
-    signature = format_signature(node.signature)
-    I = translator.body.append
-    I('<dl class="function">')
-    I('<dt id="%s">' % node["ids"][0])
-    I('<em class="property">function </em>')
-    I('<code class="descname">')
-    I(node.name)
-    I('</code>')
-    I('<span class="sig-paren">(</span>')
-    I(signature)
-    I('<span class="sig-paren">)</span>')
+    signature = format_signature(node.signature, link)
+    out = ('<em class="property">function </em>'
+           '<code class="descname">' + node.name + '</code>'
+           '<span class="sig-paren">(</span>' + signature
+           + '<span class="sig-paren">)</span>')
+    if node.returntype:
+        out += "::" + link(node.returntype)
     if tpars:
-        I(" where " + tpars)
+        out += " where " + tpars
+    return out
+
+
+@traced("visit_function", "translator")
+def visit_function(translator, node):
+    link, key = typelinker(translator, node)
+    header = caching.rendered.get_or_create(
+        ("html",) + key + node.key(),
+        lambda: format_functionheader(node, link))
+    translator.body.append('<dl class="function"><dt id="%s">'
+                           % node["ids"][0] + header)
     translator.add_permalink_ref(node, "Permalink to this function")
-    I("</dt><dd>")
+    translator.body.append("</dt><dd>")
 
 TranslatorFunctions = {
     "Module": (visit_module, depart_generic),
@@ -1,24 +1,26 @@
+from . import caching, typelinks
+from .tracing import traced
 
 
-def format_signature(translator, signature):
+def format_signature(translator, signature, link):
     arguments = signature.positionalarguments + signature.optionalarguments
-    args = [format_argument(translator, arg) for arg in arguments]
+    args = [format_argument(translator, arg, link) for arg in arguments]
     if signature.varargs is not None:
-        args.append(format_argument(translator, signature.varargs) + r"\ldots")
+        args.append(format_argument(translator, signature.varargs, link) + r"\ldots")
     if not (signature.keywordarguments or signature.kwvarargs):
         return ", ".join(args)
-    kwargs = [format_argument(translator, arg) for arg in signature.keywordarguments]
+    kwargs = [format_argument(translator, arg, link) for arg in signature.keywordarguments]
     if signature.kwvarargs is not None:
-        kwargs.append(format_argument(translator, signature.kwvarargs) + r"\ldots")
+        kwargs.append(format_argument(translator, signature.kwvarargs, link) + r"\ldots")
     return ", ".join(args) + "; " + ", ".join(kwargs)
 
 
-def format_argument(translator, argument):
+def format_argument(translator, argument, link):
     out = r"\emph{%s}" % translator.encode(argument.name)
     if argument.macrocall:
         out = r"{\scriptsize %s} " % translator.encode(argument.macrocall) + out
     if argument.argumenttype:
-        out += "::" + translator.encode(argument.argumenttype)
+        out += "::" + link(argument.argumenttype)
     if argument.value:
         out += r" = \texttt{%s}" % translator.encode(argument.value)
     return out
@@ -31,65 +33,102 @@ def format_templateparameters(translator, args):
         return ""
 
 
-def format_parenttype(translator, arg):
+def format_parenttype(translator, arg, link):
     if arg:
-        return " <: " + arg
+        return translator.encode(" <: ") + link(arg)
     else:
         return ""
 
 
-def visit_generic(translator, node, descriptor, name):
-    I = translator.body.append
-    I('\n\\begin{fulllineitems}\n')
-    I(r'\phantomsection')
-    I('\\pysigline{\\textbf{%s} %s}\\ \n' % (
-        translator.encode(descriptor),
-        translator.encode(name),))
+def typelinker(translator, node):
+    """
+    Function turning the type strings of node into LaTeX linking to the
+    documented types and the part of the render cache key it depends on.
+    """
+    env = translator.builder.env
+    scope = typelinks.nodescope(node)
+    exclude = typelinks.parameternames(getattr(node, "templateparameters", ()))
+
+    def makelink(target, name):
+        docname, anchor, uri = target
+        if docname is not None:
+            return (translator.hyperlink(docname + ":" + anchor)
+                    + translator.encode(name) + "}}")
+        if "://" in uri:
+            return r"\href{%s}{%s}" % (translator.encode_uri(uri),
+                                       translator.encode(name))
+        return translator.encode(name)
+
+    def link(typestring):
+        return typelinks.link(env, typestring, scope, exclude, makelink,
+                              translator.encode)
+    return link, (scope,)
+
+
+def labels(translator, node):
+    return "".join(translator.hypertarget(x, anchor=False)
+                   for x in node["ids"])
+
+
+def visit_generic(translator, node, descriptor, name, key=()):
+    header = caching.rendered.get_or_create(
+        ("latex",) + key + node.key(),
+        lambda: '\\pysigline{\\textbf{%s} %s}\\ \n' % (
+            translator.encode(descriptor), name()))
+    translator.body.append('\n\\begin{fulllineitems}\n\\phantomsection'
+                           + labels(translator, node) + header)
 
 
 def depart_generic(translator, node):
     translator.body.append("\\end{fulllineitems}\n")
 
 
+@traced("visit_module", "translator")
 def visit_module(translator, node):
-    visit_generic(translator, node, "module", node.name)
+    visit_generic(translator, node, "module",
+                  lambda: translator.encode(node.name))
 
 
+@traced("visit_type", "translator")
 def visit_type(translator, node):
-    tpars = format_templateparameters(translator, node.templateparameters)
-    partype = format_parenttype(translator, node.parenttype)
-    visit_generic(translator, node, "type", node.name + tpars + partype)
+    link, key = typelinker(translator, node)
+    visit_generic(translator, node, "type",
+                  lambda: format_typeheader(translator, node, link), key)
 
 
+@traced("visit_abstract", "translator")
 def visit_abstract(translator, node):
+    link, key = typelinker(translator, node)
+    visit_generic(translator, node, "abstract",
+                  lambda: format_typeheader(translator, node, link), key)
+
+
+def format_typeheader(translator, node, link):
     tpars = format_templateparameters(translator, node.templateparameters)
-    partype = format_parenttype(translator, node.parenttype)
-    visit_generic(translator, node, "abstract", node.name + tpars + partype)
+    partype = format_parenttype(translator, node.parenttype, link)
+    return translator.encode(node.name + tpars) + partype
 
 
-def visit_function(translator, node):
+def format_functionheader(translator, node, link):
     name = (r'\textbf{\texttt{%s}}' % translator.encode(node.name))
-    signature = format_signature(translator, node.signature)
+    signature = format_signature(translator, node.signature, link)
     tpars = format_templateparameters(translator, node.templateparameters)
     if tpars:
         tpars = translator.encode(" where " + tpars)
-    I = translator.body.append
-    I('\n\\begin{fulllineitems}\n')
-    I(r'\phantomsection')
-    I(r'\label{index:%s}' % node["ids"][0])
-    I('\\pysiglinewithargsret{\\textbf{function} %s}{%s}{%s}\n' % (name, signature, tpars))
-
-    # I('<dl class="function">')
-    # I('<dt id="%s">' % node["ids"][0])
-    # I('<em class="property">function </em>')
-    # I('<code class="descname">')
-    # I(node.name + tpars)
-    # I('</code>')
-    # I('<span class="sig-paren">(</span>')
-    # I(signature)
-    # I('<span class="sig-paren">)</span>')
-    # translator.add_permalink_ref(node, "Permalink to this function")
-    # I("</dt><dd>")
+    if node.returntype:
+        tpars = "::" + link(node.returntype) + tpars
+    return ('\\pysiglinewithargsret{\\textbf{function} %s}{%s}{%s}\n'
+            % (name, signature, tpars))
+
+
+@traced("visit_function", "translator")
+def visit_function(translator, node):
+    link, key = typelinker(translator, node)
+    header = caching.rendered.get_or_create(
+        ("latex",) + key + node.key(),
+        lambda: format_functionheader(translator, node, link))
+    translator.body.append('\n\\begin{fulllineitems}\n\\phantomsection'
+                           + labels(translator, node) + header)
 
 TranslatorFunctions = {
     "Module": (visit_module, depart_generic),
@@ -0,0 +1,130 @@
+"""
+Links from the types shown in rendered signatures to their documentation.
+
+Type strings like ``AbstractOperator{T, Vector{Int}}`` are split into
+names, every name which refers to a documented type or abstract type is
+turned into a link. Pages list thousands of signatures using the same few
+types, so every name is only resolved once per scope and build.
+"""
+import posixpath
+import re
+
+from . import caching, query
+
+_name = re.compile(r"[^\W\d][\w!]*(?:\.[^\W\d][\w!]*)*")
+_bound = re.compile(r"<:|>:")
+
+
+def names(typestring):
+    """
+    All (possibly qualified) names occurring in the type string.
+    """
+    return _name.findall(typestring)
+
+
+def parameternames(templateparameters):
+    """
+    Names of template parameters like ``T`` in ``where {T<:Number}``.
+    """
+    return frozenset(_bound.split(x, 1)[0].strip() for x in templateparameters)
+
+
+def nodescope(node):
+    """
+    Scope of a registered model node, taken from its id.
+    """
+    if not node["ids"]:
+        return ()
+    return tuple(node["ids"][0].split(".")[:-1])
+
+
+class Resolver:
+    """
+    Maps (scope, name) to the documented type the name refers to, given as
+    (docname, anchor, uri). docname is None for objects from other projects,
+    in which case uri is their location.
+    """
+
+    def __init__(self):
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.cache.clear()
+
+    def resolve(self, env, scope, name):
+        key = (scope, name)
+        try:
+            target = self.cache[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return target
+        self.misses += 1
+        target = None
+        dictionaries = env.domaindata["jl"]
+        inventory = getattr(env, "juliainventory", None)
+        for objtype in ("type", "abstract"):
+            matches = query.find_object_by_string(objtype, scope, name,
+                                                  dictionaries)
+            if matches:
+                target = (matches[0].docname, matches[0].uid, None)
+                break
+            if inventory is not None:
+                matches = query.find_object_by_string(
+                    objtype, scope, name, inventory.dictionaries)
+                if matches:
+                    target = (None, matches[0].uid, matches[0].uri)
+                    break
+        self.cache[key] = target
+        return target
+
+
+resolver = Resolver()
+
+
+def link(env, typestring, scope, exclude, makelink, escape=str):
+    """
+    Replace every name in typestring which refers to a documented type by
+    makelink(target, name), everything else is passed through escape. Names
+    in exclude (e.g. template parameters) are never linked.
+    """
+    out = []
+    position = 0
+    for match in _name.finditer(typestring):
+        name = match.group()
+        out.append(escape(typestring[position:match.start()]))
+        position = match.end()
+        if name in exclude:
+            target = None
+        else:
+            target = resolver.resolve(env, scope, name)
+        if target is None:
+            out.append(escape(name))
+        else:
+            out.append(makelink(target, name))
+    out.append(escape(typestring[position:]))
+    return "".join(out)
+
+
+def relative_uri(directory, uri):
+    """
+    URI relative to the given output directory. Links only depend on the
+    directory of a page, which lets all pages in it share rendered headers.
+    """
+    uri = uri.split("#", 1)[0]
+    if "://" in uri:
+        return uri
+    relative = posixpath.relpath(uri or ".", directory or ".")
+    if uri.endswith("/") and not relative.endswith("/"):
+        relative += "/"
+    return relative
+
+
+def clear(app, env):
+    # Rendered headers contain links and are only valid for the domain data
+    # they were rendered with.
+    resolver.clear()
+    caching.rendered.clear()
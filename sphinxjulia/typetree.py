@@ -0,0 +1,166 @@
+"""
+The ``jl:typetree`` directive showing the hierarchy of a type.
+
+Subtypes can be documented anywhere in the project, the directive
+therefore only leaves a placeholder which is replaced when the references
+are resolved. Subtypes and supertypes are looked up in the "subtypes" and
+"supertypes" indexes of the domain data instead of scanning all types.
+"""
+from docutils import nodes
+from docutils.parsers.rst import Directive, directives
+
+from sphinx.transforms import SphinxTransform
+from sphinx.util import logging
+from sphinx.util.nodes import make_refnode
+
+from . import model, placeholders, query
+
+logger = logging.getLogger(__name__)
+
+# Only abstract types can have subtypes in julia but parent types given in
+# the documentation are looked up as types as well.
+_objtypes = ("abstract", "type")
+
+dependents = placeholders.Dependents("typetrees",
+                                     ("subtypes", "abstract", "type"))
+
+
+class typetree(nodes.General, nodes.Element):
+    """
+    Placeholder for the type tree of the type named target.
+    """
+
+
+class TypeTree(Directive):
+    required_arguments = 1
+    optional_arguments = 0
+    final_argument_whitespace = False
+    option_spec = {
+        'depth': directives.nonnegative_int,
+        'supertypes': directives.flag,
+    }
+
+    def run(self):
+        env = self.state.document.settings.env
+        target = self.arguments[0]
+        scope = model.intern_scope(env.ref_context.get('jl:scope', []))
+        dependents.register(env, target, scope)
+        node = typetree(target=target, scope=scope,
+                        depth=self.options.get('depth'),
+                        supertypes='supertypes' in self.options)
+        node.source, node.line = \
+            self.state_machine.get_source_and_line(self.lineno)
+        return [node]
+
+
+def find_type(dictionaries, scope, name):
+    """
+    Entry of the type or abstract type referred to by name from scope.
+    """
+    for objtype in _objtypes:
+        matches = query.find_object_by_string(objtype, scope, name,
+                                              dictionaries)
+        if matches:
+            return matches[0]
+    return None
+
+
+class Hierarchy:
+    """
+    Subtypes and supertypes of documented types, resolved lazily from the
+    indexes in the domain data.
+    """
+
+    def __init__(self, dictionaries):
+        self.dictionaries = dictionaries
+        self.parents = {}
+
+    def parent(self, entry):
+        """
+        (name of the parent type, entry of the parent or None).
+        """
+        key = (entry.scope, entry.parenttype)
+        if key not in self.parents:
+            self.parents[key] = find_type(self.dictionaries, entry.scope,
+                                          entry.parenttype)
+        return entry.parenttype, self.parents[key]
+
+    def subtypes(self, entry):
+        name = entry.uid.rsplit(".", 1)[-1]
+        result = []
+        for candidate in self.dictionaries["subtypes"].get(name, []):
+            parent = self.parent(candidate)[1]
+            if parent is not None and parent.uid == entry.uid:
+                result.append(candidate)
+        return sorted(result, key=lambda x: x.uid)
+
+    def supertypes(self, entry):
+        """
+        Names and entries (None if not documented) of the parent types,
+        starting with the direct parent.
+        """
+        result = []
+        seen = set([entry.uid])
+        while entry is not None:
+            candidates = self.dictionaries["supertypes"].get(entry.uid)
+            if not candidates:
+                break
+            name, entry = self.parent(candidates[0])
+            result.append((name, entry))
+            if entry is not None:
+                if entry.uid in seen:
+                    break
+                seen.add(entry.uid)
+        return result
+
+
+class TypeTreeResolver(SphinxTransform):
+    default_priority = 20
+
+    def apply(self):
+        hierarchy = None
+        for node in self.document.traverse(typetree):
+            if hierarchy is None:
+                hierarchy = Hierarchy(self.env.domaindata['jl'])
+            entry = find_type(hierarchy.dictionaries, node['scope'],
+                              node['target'])
+            if entry is None:
+                logger.warning('No type found for type tree ' + node['target'],
+                               location=node)
+                node.replace_self([])
+                continue
+            node.replace_self(self.render(hierarchy, node, entry))
+
+    def render(self, hierarchy, node, entry):
+        item = self.item(entry.uid, entry)
+        item += self.subtree(hierarchy, entry, node['depth'], set([entry.uid]))
+        if node['supertypes']:
+            for name, parent in hierarchy.supertypes(entry):
+                outer = self.item(name if parent is None else parent.uid,
+                                  parent)
+                outer += nodes.bullet_list('', item)
+                item = outer
+        return nodes.bullet_list('', item, classes=['jl-typetree'])
+
+    def subtree(self, hierarchy, entry, depth, seen):
+        if depth == 0:
+            return []
+        items = []
+        for subtype in hierarchy.subtypes(entry):
+            if subtype.uid in seen:
+                continue
+            item = self.item(subtype.uid, subtype)
+            item += self.subtree(hierarchy, subtype,
+                                 None if depth is None else depth - 1,
+                                 seen | set([subtype.uid]))
+            items.append(item)
+        if not items:
+            return []
+        return [nodes.bullet_list('', *items)]
+
+    def item(self, name, entry):
+        text = nodes.literal(name, name)
+        if entry is not None:
+            text = make_refnode(self.app.builder, self.env.docname,
+                                entry.docname, entry.uid, text, name)
+        return nodes.list_item('', nodes.paragraph('', '', text))
@@ -115,9 +115,14 @@ julia_signature_show_qualifier = False
 julia_signature_show_type = True
 julia_signature_show_default = True
 julia_docstring_show_type = True
+julia_suggestions = True
+julia_inventories = {
+    'other': ('https://example.org/other/', '_inventories/other.inv'),
+}
 
 # Julia autodoc
 juliaautodoc_basedir = "../src"
+juliaautodoc_cache_results = 100
 
 # Napoleon settings
 napoleon_google_docstring = False
@@ -0,0 +1,20 @@
+"""
+Package assembled from several files.
+"""
+module Package
+
+"""
+Function defined before the include.
+"""
+function before(x)
+end
+
+include("operators.jl")
+
+"""
+Function defined after the include.
+"""
+function after(x)
+end
+
+end
@@ -0,0 +1,10 @@
+"""
+Operator type defined in an included file.
+"""
+abstract type Operator end
+
+"""
+Apply an operator.
+"""
+function apply(op::Operator, x)
+end
@@ -0,0 +1,39 @@
+"""
+Module documented with one page per symbol.
+"""
+module Split
+
+"""
+Scale a number.
+"""
+function scale(x::Real, factor::Real=2)
+end
+
+"""
+Scale all numbers of a vector.
+"""
+function scale(x::Vector; inplace::Bool=false)
+end
+
+"""
+Point in the plane.
+"""
+struct Point
+    x::Float64
+    y::Float64
+end
+
+"""
+Nested module split on its own page.
+"""
+module Inner
+
+"""
+Function of the nested module.
+"""
+function inner(x)
+end
+
+end
+
+end
@@ -0,0 +1,13 @@
+"""
+Abstract operator.
+"""
+abstract type AbstractOp end
+
+"""
+Operator with an inner constructor.
+"""
+struct Sub <: AbstractOp
+    x::Int
+
+    Sub(x::Int) = new(x)
+end